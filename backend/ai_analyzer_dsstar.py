@@ -26,8 +26,12 @@ The DS-STAR pipeline handles ALL query types adaptively:
 """
 
 import os
+import asyncio
+import hashlib
 import logging
-from typing import Dict, Any, Optional
+import time
+import orjson
+from typing import AsyncIterator, Callable, Dict, Any, Optional
 from motor.motor_asyncio import AsyncIOMotorDatabase
 import google.generativeai as genai
 from pathlib import Path
@@ -47,6 +51,9 @@ BACKEND_DIR = Path(__file__).resolve().parent
 ENV_PATH = BACKEND_DIR.parent / 'frontend' / '.env'
 load_dotenv(ENV_PATH)
 
+# The data version behind data_fingerprint is re-read at most this often
+FINGERPRINT_TTL_SECONDS = float(os.environ.get('FINGERPRINT_TTL_SECONDS', '60'))
+
 
 class PolicyAIAnalyzer:
     """
@@ -76,6 +83,9 @@ class PolicyAIAnalyzer:
         self.dsstar = DSStarOrchestrator(db)
         logger.info("[PolicyAIAnalyzer] DS-STAR framework initialised")
 
+        # (expires_at monotonic, data version) for data_fingerprint
+        self._data_version: Optional[tuple] = None
+
     # --------------------------------------------------------------------------
     # PUBLIC API (same signature as original ai_analyzer.py)
     # --------------------------------------------------------------------------
@@ -84,7 +94,8 @@ class PolicyAIAnalyzer:
         self,
         query: str,
         language: str = "Indonesian",
-        scraped_data: Optional[str] = None   # kept for API compatibility; not used
+        scraped_data: Optional[str] = None,  # kept for API compatibility; not used
+        on_event: Optional[Callable[[Dict[str, Any]], None]] = None
     ) -> Dict[str, Any]:
         """
         Analyse a user query using the full DS-STAR pipeline.
@@ -98,7 +109,7 @@ class PolicyAIAnalyzer:
         try:
             logger.info(f"[PolicyAIAnalyzer] Incoming query: {query[:80]}...")
 
-            result = await self.dsstar.analyze(query, language)
+            result = await self.dsstar.analyze(query, language, on_event=on_event)
 
             logger.info(
                 f"[PolicyAIAnalyzer] Done — "
@@ -119,9 +130,94 @@ class PolicyAIAnalyzer:
                 'visualizations': [],
                 'insights': [],
                 'policies': [],
-                'supporting_data_count': 0
+                'supporting_data_count': 0,
+                'error': True
             }
 
+    async def analyze_policy_query_stream(
+        self,
+        query: str,
+        language: str = "Indonesian"
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Same analysis as analyze_policy_query, as a stream of events:
+          {'type': 'status', 'phase', 'detail'} while the pipeline runs,
+          {'type': 'delta', 'text'} for message text as it is generated,
+          {'type': 'insight', 'text'} for each insight as it is completed,
+          {'type': 'result', ...analyze_policy_query output} last.
+        The final result's message is authoritative (it may be a fallback
+        text when generation fails part-way).
+        """
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+
+        def emit(event: Optional[Dict[str, Any]]):
+            # Pipeline events can come from LLM worker threads
+            loop.call_soon_threadsafe(queue.put_nowait, event)
+
+        task = asyncio.ensure_future(
+            self.analyze_policy_query(query, language, on_event=emit)
+        )
+        task.add_done_callback(lambda _task: emit(None))
+        try:
+            while True:
+                event = await queue.get()
+                if event is None:
+                    break
+                yield event
+            yield {'type': 'result', **task.result()}
+        finally:
+            # Client went away mid-stream: stop the pipeline
+            if not task.done():
+                task.cancel()
+
+    async def data_fingerprint(self) -> Optional[str]:
+        """
+        Marker of what an answer depends on besides the query: the analysed
+        collection's content and the LLM model that _call_llm actually uses.
+        Returns None if the collection cannot be read.
+        """
+        cfg = self.dsstar.config
+        version = await self._collection_version(cfg.collection_name)
+        if version is None:
+            return None
+        model = os.environ.get('LLM_MODEL', 'gemini-2.0-flash-exp')
+        return f"{cfg.db_name}.{cfg.collection_name}:{version}:{model}"
+
+    async def _collection_version(self, collection_name: str) -> Optional[str]:
+        """
+        Content hash of the collection, so in-place corrections change it too.
+        initial_data is small (one document per province) and has no update
+        timestamps; the hash is cached for FINGERPRINT_TTL_SECONDS.
+        """
+        now = time.monotonic()
+        if self._data_version and now < self._data_version[0]:
+            return self._data_version[1]
+        try:
+            digest = hashlib.blake2b(digest_size=16)
+            async for doc in self.db[collection_name].find({}).sort('_id', 1):
+                digest.update(orjson.dumps(doc, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS, default=str))
+        except Exception as e:
+            logger.warning(f"[PolicyAIAnalyzer] Data fingerprint unavailable: {e}")
+            return None
+        version = digest.hexdigest()
+        self._data_version = (now + FINGERPRINT_TTL_SECONDS, version)
+        return version
+
+    async def warmup(self) -> bool:
+        """
+        Build the Phase 1 data description ahead of the first /chat.
+        It is the pipeline's cold-start cost (LLM call + generated code run) and
+        also opens the Gemini connection; afterwards it is served from cache.
+        """
+        try:
+            await self.dsstar.analyzer.get_data_description()
+            logger.info("[PolicyAIAnalyzer] Warm-up complete")
+            return True
+        except Exception as e:
+            logger.warning(f"[PolicyAIAnalyzer] Warm-up failed, first query will build the context: {e}")
+            return False
+
     # --------------------------------------------------------------------------
     # DIAGNOSTIC / DEBUG HELPERS
     # --------------------------------------------------------------------------
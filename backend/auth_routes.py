@@ -10,6 +10,7 @@ from typing import Optional
 import logging
 import os
 from datetime import datetime, timedelta, timezone
+from urllib.parse import quote
 
 logger = logging.getLogger(__name__)
 
@@ -197,7 +198,6 @@ async def google_callback(
         
         # Create redirect URL with user info in fragment
         # URL encode the values to handle special characters
-        from urllib.parse import quote
         redirect_url = (
             f"{frontend_url}/auth/callback"
             f"#session_token={session_token}"
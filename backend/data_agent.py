@@ -109,6 +109,14 @@ class DataRetrievalAgent:
             total += self._get_sector_value(doc, sector_code)
         return total
     
+    def _doc_total(self, doc: Dict[str, Any]) -> int:
+        """filtered_total, else total, else the sum over all sectors (only computed when needed)"""
+        if 'filtered_total' in doc:
+            return doc['filtered_total']
+        if 'total' in doc:
+            return doc['total']
+        return self._calculate_province_total(doc)
+    
     async def understand_query(self, query: str) -> QueryIntent:
         """
         Improved Logic:
@@ -398,7 +406,7 @@ class DataRetrievalAgent:
         # Calculate totals per province
         provinces_data = []
         for doc in data:
-            total = doc.get('filtered_total', doc.get('total', self._calculate_province_total(doc)))
+            total = self._doc_total(doc)
             provinces_data.append({
                 'provinsi': doc.get('provinsi', ''),
                 'total': total
@@ -440,7 +448,7 @@ class DataRetrievalAgent:
             ranked = sorted(data, key=lambda x: x.get('filtered_total', 0), reverse=True)
         else:
             # Ranking berdasarkan total semua sektor
-            ranked = sorted(data, key=lambda x: x.get('total', self._calculate_province_total(x)), reverse=True)
+            ranked = sorted(data, key=lambda x: x['total'] if 'total' in x else self._calculate_province_total(x), reverse=True)
         
         return {
             'type': 'ranking',
@@ -454,7 +462,7 @@ class DataRetrievalAgent:
         comparison_data = []
         
         for doc in data:
-            total = doc.get('filtered_total', doc.get('total', self._calculate_province_total(doc)))
+            total = self._doc_total(doc)
             entry = {
                 'provinsi': doc.get('provinsi', ''),
                 'total': total
@@ -18,19 +18,26 @@ logger = logging.getLogger(__name__)
 class RealDataProvider:
     """Provides access to real economic and policy data from reliable sources"""
     
-    def __init__(self):
-        self.session = None
+    def __init__(self, session: Optional[aiohttp.ClientSession] = None):
+        # A long-lived caller can pass its own session so repeated runs share one warm connection pool;
+        # an injected session is left open on exit
+        self.session = session
+        self._owns_session = session is None
     
     async def __aenter__(self):
+        if self.session is not None:
+            return self
         self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(ttl_dns_cache=300),
             timeout=aiohttp.ClientTimeout(total=30),
             headers={'User-Agent': 'PolicyAnalysisBot/1.0'}
         )
         return self
     
     async def __aexit__(self, exc_type, exc_val, exc_tb):
-        if self.session:
+        if self.session and self._owns_session:
             await self.session.close()
+            self.session = None
     
     async def get_world_bank_data(self, country_codes: List[str] = ['USA', 'IDN'], indicators: List[str] = None) -> List[ScrapedData]:
         """Get real economic data from World Bank API"""
@@ -170,46 +177,65 @@ class RealDataProvider:
         """Collect all available real data"""
         all_data = []
         
-        try:
-            # Get World Bank economic data
-            wb_data = await self.get_world_bank_data()
-            all_data.extend(wb_data)
-            
-            # Get policy examples
-            policy_data = await self.get_policy_examples()
-            all_data.extend(policy_data)
-            
-            logger.info(f"Collected {len(all_data)} real data points total")
-            
-        except Exception as e:
-            logger.error(f"Error collecting real data: {e}")
-            # Fallback to policy examples only
-            all_data = await self.get_policy_examples()
+        # World Bank data and policy examples are independent; fetch them concurrently
+        results = await asyncio.gather(
+            self.get_world_bank_data(),
+            self.get_policy_examples(),
+            return_exceptions=True
+        )
         
+        # A failed source is logged and skipped, so the other one is still kept
+        for source, result in zip(("World Bank", "policy examples"), results):
+            if isinstance(result, Exception):
+                logger.error(f"Error collecting {source} data: {result}")
+            else:
+                all_data.extend(result)
+        
+        logger.info(f"Collected {len(all_data)} real data points total")
         return all_data
 
 
 async def populate_real_data():
-    """Populate database with real data"""
+    """Populate database with real data (skipped while another process is already collecting)"""
+    # Import here to avoid circular imports
+    from database import PolicyDatabase, SCRAPE_LOCK, SCRAPE_LOCK_TTL_SECONDS
+    
+    mongo_url = os.environ.get('MONGO_URL')
+    if not mongo_url:
+        logger.error("MONGO_URL is not set, cannot populate real data")
+        return 0
+    db_name = os.environ.get('DB_NAME', 'policy_db')
+    policy_db = PolicyDatabase(mongo_url, db_name)
     try:
-        async with RealDataProvider() as provider:
-            real_data = await provider.collect_all_real_data()
+        # Standalone runs never go through the API's startup: make sure the url index exists
+        await policy_db.init_collections()
+        lock_token = await policy_db.acquire_lock(SCRAPE_LOCK, SCRAPE_LOCK_TTL_SECONDS)
+        if lock_token is None:
+            logger.info("Data collection already running elsewhere, skipping")
+            return 0
+        try:
+            async with RealDataProvider() as provider:
+                real_data = await provider.collect_all_real_data()
             
-            if real_data:
-                # Import here to avoid circular imports
-                from database import PolicyDatabase
-                import os
-                
-                mongo_url = os.environ['MONGO_URL']
-                db_name = os.environ['DB_NAME']
-                policy_db = PolicyDatabase(mongo_url, db_name)
-                
-                saved_count = await policy_db.save_scraped_data(real_data)
-                logger.info(f"Populated database with {saved_count} real data points")
-                
-                await policy_db.close()
-                return saved_count
+            if not real_data:
+                return 0
+            saved_count = await policy_db.save_scraped_data(real_data)
+            logger.info(f"Populated database with {saved_count} real data points")
+            return saved_count
+        finally:
+            await policy_db.release_lock(SCRAPE_LOCK, lock_token)
             
     except Exception as e:
         logger.error(f"Error populating real data: {e}")
-        return 0
\ No newline at end of file
+        return 0
+    finally:
+        await policy_db.close()
+
+
+if __name__ == "__main__":
+    # Run collection as its own process (cron / worker container), outside the API server's event loop:
+    #   python data_sources.py
+    from dotenv import load_dotenv
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(populate_real_data())
@@ -1,21 +1,41 @@
 from motor.motor_asyncio import AsyncIOMotorClient
+from cachetools import TTLCache
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError, OperationFailure
 from models import ScrapedData, ChatSession, ChatMessage, PolicyInsight, PolicyRecommendation
+import asyncio
 import os
 import logging
-from datetime import datetime
-from typing import List, Optional, Dict
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import AsyncIterator, List, Optional, Dict
 
 logger = logging.getLogger(__name__)
 
+# Connection pool size; tune per deployment (one pool per worker process)
+MONGO_MAX_POOL_SIZE = int(os.environ.get('MONGO_MAX_POOL_SIZE', '50'))
+# Cached /chat analyses expire after this many seconds (TTL index on analysis_cache.created_at)
+ANALYSIS_CACHE_TTL_SECONDS = int(os.environ.get('ANALYSIS_CACHE_TTL_SECONDS', '86400'))
+# get_database_stats result is reused for this many seconds (health probes, dashboard polling)
+STATS_CACHE_TTL_SECONDS = float(os.environ.get('STATS_CACHE_TTL_SECONDS', '30'))
+# Recently read chat sessions are served from memory (polling, report downloads); writes evict them
+SESSION_CACHE_SIZE = int(os.environ.get('SESSION_CACHE_SIZE', '1024'))
+SESSION_CACHE_TTL_SECONDS = float(os.environ.get('SESSION_CACHE_TTL_SECONDS', '15'))
+# Cross-process lock held while real data is collected; expires on its own if the holder dies
+SCRAPE_LOCK = "scrape"
+SCRAPE_LOCK_TTL_SECONDS = int(os.environ.get('SCRAPE_LOCK_TTL_SECONDS', '900'))
+
 class PolicyDatabase:
-    def __init__(self, mongo_url: str, db_name: str):
-        # Optimized connection settings for better performance and reliability
-        self.client = AsyncIOMotorClient(
+    def __init__(self, mongo_url: str, db_name: str, client=None):
+        # A pre-created client (any driver exposing Motor's collection/cursor API) can be injected;
+        # otherwise Motor is used with optimized connection settings for performance and reliability
+        self.client = client if client is not None else AsyncIOMotorClient(
             mongo_url,
             serverSelectionTimeoutMS=30000,  # 30 seconds for initial connection
             connectTimeoutMS=30000,          # 30 seconds connection timeout
             socketTimeoutMS=60000,           # 60 seconds socket timeout for operations
-            maxPoolSize=50,                  # Connection pool size
+            maxPoolSize=MONGO_MAX_POOL_SIZE, # Connection pool size
             minPoolSize=5,                   # Minimum connections to maintain
             maxIdleTimeMS=60000,             # Close idle connections after 60s
             retryWrites=True,                # Retry failed writes
@@ -25,6 +45,10 @@ class PolicyDatabase:
         )
         self.db = self.client[db_name]
         self._connected = False
+        self._stats: Optional[dict] = None
+        self._stats_at = 0.0
+        self._stats_lock = asyncio.Lock()
+        self._session_cache: TTLCache = TTLCache(maxsize=SESSION_CACHE_SIZE, ttl=SESSION_CACHE_TTL_SECONDS)
         
     async def init_collections(self):
         """Initialize database collections with indexes"""
@@ -39,6 +63,13 @@ class PolicyDatabase:
                 await self.db.scraped_data.create_index("source", background=True)
                 await self.db.scraped_data.create_index("category", background=True)
                 await self.db.scraped_data.create_index("scraped_at", background=True)
+                await self.db.scraped_data.create_index(
+                    [("category", 1), ("scraped_at", -1)],
+                    background=True
+                )  # Compound index for recent data filtered by category
+                
+                # One document per source URL; save_scraped_data upserts on it
+                await self._create_url_index()
                 
                 # Text search index
                 try:
@@ -69,6 +100,15 @@ class PolicyDatabase:
                 await self.db.user_sessions.create_index("user_id", background=True)
                 await self.db.user_sessions.create_index("expires_at", background=True)
                 
+                # Analysis result cache - exact-match key, entries expire via TTL
+                await self.db.analysis_cache.create_index("cache_key", unique=True, background=True)
+                await self.db.analysis_cache.create_index(
+                    "created_at", expireAfterSeconds=ANALYSIS_CACHE_TTL_SECONDS, background=True
+                )
+                
+                # Expired locks are removed by TTL; acquire_lock doesn't depend on it
+                await self.db.locks.create_index("expires_at", expireAfterSeconds=0, background=True)
+                
                 logger.info("Database indexes created/verified")
             except Exception as e:
                 logger.warning(f"Error creating some indexes (may already exist): {e}")
@@ -77,82 +117,125 @@ class PolicyDatabase:
             logger.error(f"Error connecting to database: {e}")
             raise e
 
+    async def _create_url_index(self):
+        """
+        Unique url index for the upserts. Collections filled by the old append-only collector
+        may hold duplicate URLs; startup never deletes data, so a plain url index is used then
+        (keeps the upserts off a collection scan) until dedupe_scraped_urls.py has been run.
+        """
+        try:
+            await self.db.scraped_data.create_index("url", unique=True, background=True)
+        except OperationFailure as e:
+            if e.code != 11000:
+                # e.g. the plain url index from an earlier fallback already exists
+                logger.warning(f"Unique url index not created: {e}")
+                return
+            logger.warning(
+                "scraped_data holds duplicate URLs, using a non-unique url index; "
+                "run `python dedupe_scraped_urls.py` to enable the unique one"
+            )
+            await self.db.scraped_data.create_index("url", background=True)
+
     @property
     def is_connected(self) -> bool:
         return self._connected
 
     # Scraped Data operations
     async def save_scraped_data(self, data: List[ScrapedData]) -> int:
-        """Save scraped data to database"""
+        """Save scraped data to database (upsert by url: new items inserted, re-scraped ones refreshed)"""
         try:
             if not data:
                 return 0
             
-            data_dicts = []
+            items_by_url = {}
             for item in data:
                 item_dict = item.dict()
                 if 'scraped_at' in item_dict and hasattr(item_dict['scraped_at'], 'isoformat'):
                     item_dict['scraped_at'] = item_dict['scraped_at'].isoformat()
-                data_dicts.append(item_dict)
+                items_by_url[item_dict['url']] = item_dict  # Last one wins within a batch
             
-            # Use insert_many with ordered=False to continue on duplicates
-            result = await self.db.scraped_data.insert_many(data_dicts, ordered=False)
-            logger.info(f"Saved {len(result.inserted_ids)} scraped items to database")
-            return len(result.inserted_ids)
+            # One unordered bulk round-trip; the id is kept from the first insert
+            ops = [
+                UpdateOne(
+                    {"url": url},
+                    {"$set": {k: v for k, v in item_dict.items() if k != 'id'},
+                     "$setOnInsert": {"id": item_dict['id']}},
+                    upsert=True
+                )
+                for url, item_dict in items_by_url.items()
+            ]
+            result = await self.db.scraped_data.bulk_write(ops, ordered=False)
+            saved = result.upserted_count + result.modified_count
+            logger.info(f"Saved {saved} scraped items to database ({result.upserted_count} new)")
+            self.invalidate_stats()
+            return saved
             
         except Exception as e:
             # Handle bulk write errors specifically
-            if hasattr(e, 'details') and 'nInserted' in e.details:
-                inserted = e.details['nInserted']
-                if inserted > 0:
-                    logger.info(f"Saved {inserted} items (some failed due to duplicates)")
-                    return inserted
+            if hasattr(e, 'details') and 'nUpserted' in e.details:
+                saved = e.details['nUpserted'] + e.details.get('nModified', 0)
+                if saved > 0:
+                    logger.info(f"Saved {saved} items (some failed due to duplicates)")
+                    self.invalidate_stats()
+                    return saved
             
             logger.error(f"Error saving scraped data: {e}")
             return 0
 
-    async def get_recent_scraped_data(self, limit: int = 100, category: Optional[str] = None) -> List[ScrapedData]:
-        """Get recent scraped data"""
-        try:
-            query = {}
-            if category:
-                query["category"] = category
-                
-            cursor = self.db.scraped_data.find(query).sort("scraped_at", -1).limit(limit)
-            data = await cursor.to_list(length=limit)
-            return [ScrapedData(**item) for item in data]
-        except Exception as e:
-            logger.error(f"Error fetching scraped data: {e}")
-            return []
+    async def latest_scraped_at(self, category: Optional[str] = None):
+        """Newest scraped_at (optionally per category); saves stamp it, so it versions the recent list"""
+        doc = await self.db.scraped_data.find_one(
+            {"category": category} if category else {},
+            {"_id": 0, "scraped_at": 1},
+            sort=[("scraped_at", -1)]
+        )
+        return doc.get("scraped_at") if doc else None
+
+    async def iter_recent_scraped_data(self, limit: int = 100, category: Optional[str] = None) -> AsyncIterator[dict]:
+        """Stream recent scraped data as raw documents (without _id), skipping model validation"""
+        query = {"category": category} if category else {}
+        cursor = self.db.scraped_data.find(query, {"_id": 0}).sort("scraped_at", -1).limit(limit)
+        async for doc in cursor:
+            yield doc
 
-    async def search_scraped_data(self, query: str, limit: int = 50) -> List[ScrapedData]:
-        """Search scraped data by text"""
+    def _text_search_cursor(self, query: str, limit: int):
+        """Text index seek, best matches first; textScore is returned as relevance_score"""
+        return (
+            self.db.scraped_data.find(
+                {"$text": {"$search": query}},
+                {"_id": 0, "relevance_score": {"$meta": "textScore"}}
+            )
+            .sort([("relevance_score", {"$meta": "textScore"})])
+            .limit(limit)
+        )
+
+    def _regex_search_cursor(self, query: str, limit: int):
+        """Fallback when the text index is missing (collection scan)"""
+        regex_query = {
+            "$or": [
+                {"title": {"$regex": query, "$options": "i"}},
+                {"content": {"$regex": query, "$options": "i"}}
+            ]
+        }
+        return self.db.scraped_data.find(regex_query, {"_id": 0}).sort("scraped_at", -1).limit(limit)
+
+    async def iter_search_scraped_data(self, query: str, limit: int = 50) -> AsyncIterator[dict]:
+        """Stream search results as raw documents (without _id), skipping model validation"""
+        started = False
         try:
-            # Try text search first
-            text_query = {"$text": {"$search": query}}
-            
-            try:
-                cursor = self.db.scraped_data.find(text_query).limit(limit)
-                data = await cursor.to_list(length=limit)
-                if data:
-                    return [ScrapedData(**item) for item in data]
-            except Exception:
-                pass  # Text index might not exist
-            
-            # Fallback to regex search
-            regex_query = {
-                "$or": [
-                    {"title": {"$regex": query, "$options": "i"}},
-                    {"content": {"$regex": query, "$options": "i"}}
-                ]
-            }
-            cursor = self.db.scraped_data.find(regex_query).sort("scraped_at", -1).limit(limit)
-            data = await cursor.to_list(length=limit)
-            return [ScrapedData(**item) for item in data]
-            
+            async for doc in self._text_search_cursor(query, limit):
+                started = True
+                yield doc
         except Exception as e:
-            logger.error(f"Error searching scraped data: {e}")
-            return []
+            if started:
+                raise
+            logger.debug(f"Text search unavailable, using regex: {e}")  # Text index might not exist
+        if started:
+            return
+        
+        # No text match (stemmed whole words only): partial words/substrings via case-insensitive regex
+        async for doc in self._regex_search_cursor(query, limit):
+            yield doc
 
     # ============================================
     # CHAT SESSION OPERATIONS - UPDATED WITH USER_ID
@@ -183,21 +266,26 @@ class PolicyDatabase:
             session_id: Session ID to fetch
             user_id: If provided, verify the session belongs to this user
         """
-        try:
-            query = {"id": session_id}
-            
-            # If user_id provided, add ownership check
-            if user_id:
-                query["user_id"] = user_id
-            
-            session_data = await self.db.chat_sessions.find_one(query)
-            
-            if session_data:
-                return ChatSession(**session_data)
-            return None
-        except Exception as e:
-            logger.error(f"Error fetching chat session: {e}")
+        session = self._session_cache.get(session_id)
+        if session is None:
+            try:
+                session_data = await self.db.chat_sessions.find_one({"id": session_id})
+                if not session_data:
+                    return None
+                session = self._session_cache[session_id] = ChatSession(**session_data)
+            except Exception as e:
+                logger.error(f"Error fetching chat session: {e}")
+                return None
+        
+        # If user_id provided, add ownership check
+        if user_id and session.user_id != user_id:
             return None
+        return session
+
+    def invalidate_session(self, *session_ids: str):
+        """Evict sessions from the read cache after they were written or deleted"""
+        for session_id in session_ids:
+            self._session_cache.pop(session_id, None)
 
     async def save_chat_message(self, message: ChatMessage) -> bool:
         """
@@ -219,6 +307,7 @@ class PolicyDatabase:
                     "$set": {"updated_at": datetime.utcnow()}
                 }
             )
+            self.invalidate_session(message.session_id)
             
             if result.modified_count > 0:
                 return True
@@ -230,6 +319,75 @@ class PolicyDatabase:
             logger.error(f"Error saving chat message: {e}")
             return False
 
+    async def save_chat_messages(self, messages: List[ChatMessage]) -> bool:
+        """Append several messages of one session in a single update ($push with $each, order kept)"""
+        if not messages:
+            return True
+        session_id = messages[0].session_id
+        try:
+            message_dicts = []
+            for message in messages:
+                message_dict = message.dict()
+                if 'timestamp' in message_dict and isinstance(message_dict['timestamp'], datetime):
+                    message_dict['timestamp'] = message_dict['timestamp'].isoformat()
+                message_dicts.append(message_dict)
+            
+            result = await self.db.chat_sessions.update_one(
+                {"id": session_id},
+                {
+                    "$push": {"messages": {"$each": message_dicts}},
+                    "$set": {"updated_at": datetime.utcnow()}
+                }
+            )
+            self.invalidate_session(session_id)
+            
+            if result.modified_count > 0:
+                return True
+            logger.warning(f"Session {session_id} not found when saving messages.")
+            return False
+        except Exception as e:
+            logger.error(f"Error saving chat messages: {e}")
+            return False
+
+    # Analysis cache operations
+    async def get_cached_analysis(self, cache_key: str) -> Optional[dict]:
+        """Return a cached analysis_result for cache_key, or None on miss"""
+        try:
+            doc = await self.db.analysis_cache.find_one(
+                {"cache_key": cache_key}, {"_id": 0, "analysis_result": 1}
+            )
+            return doc["analysis_result"] if doc else None
+        except Exception as e:
+            logger.error(f"Error reading analysis cache: {e}")
+            return None
+
+    async def save_cached_analysis(self, cache_key: str, analysis_result: dict) -> bool:
+        """Store an analysis_result; upsert so concurrent misses on the same key don't collide"""
+        try:
+            await self.db.analysis_cache.update_one(
+                {"cache_key": cache_key},
+                {"$set": {"analysis_result": analysis_result, "created_at": datetime.utcnow()}},
+                upsert=True
+            )
+            return True
+        except Exception as e:
+            logger.error(f"Error saving analysis cache: {e}")
+            return False
+
+    @staticmethod
+    def _session_owner_query(user_id: Optional[str]) -> dict:
+        """Build the chat_sessions filter for a user (or for anonymous sessions)"""
+        if user_id:
+            # User is authenticated - get only their sessions
+            return {"user_id": user_id}
+        # Anonymous user - get sessions that have no user_id OR user_id is null
+        # {"user_id": None} matches both in MongoDB:
+        # - Old sessions without user_id field
+        # - Sessions created with user_id: null
+        # and, unlike an $or of the two, is one range on the (user_id, updated_at) index,
+        # so sort + limit walk the index instead of sorting in memory
+        return {"user_id": None}
+
     async def get_chat_sessions(self, limit: int = 10, user_id: Optional[str] = None) -> List[ChatSession]:
         """
         Get recent chat sessions for a specific user
@@ -239,21 +397,7 @@ class PolicyDatabase:
             user_id: Filter sessions by user (required for user-specific queries)
         """
         try:
-            # Build query based on user_id
-            query = {}
-            if user_id:
-                # User is authenticated - get only their sessions
-                query["user_id"] = user_id
-            else:
-                # Anonymous user - get sessions that have no user_id OR user_id is null
-                # This handles both:
-                # - Old sessions without user_id field
-                # - Sessions created with user_id: null
-                query["$or"] = [
-                    {"user_id": {"$exists": False}},
-                    {"user_id": None}
-                ]
-            
+            query = self._session_owner_query(user_id)
             cursor = self.db.chat_sessions.find(query).sort("updated_at", -1).limit(limit)
             sessions_data = await cursor.to_list(length=limit)
             
@@ -270,6 +414,14 @@ class PolicyDatabase:
             logger.error(f"Error fetching chat sessions: {e}")
             return []
 
+    async def iter_chat_sessions(self, limit: int = 10, user_id: Optional[str] = None) -> AsyncIterator[dict]:
+        """Stream recent chat sessions as raw documents (without _id), skipping model validation"""
+        cursor = self.db.chat_sessions.find(
+            self._session_owner_query(user_id), {"_id": 0}
+        ).sort("updated_at", -1).limit(limit)
+        async for doc in cursor:
+            yield doc
+
     async def delete_chat_session(self, session_id: str, user_id: Optional[str] = None) -> bool:
         """
         Delete a single chat session with optional user ownership verification
@@ -286,6 +438,7 @@ class PolicyDatabase:
                 query["user_id"] = user_id
             
             result = await self.db.chat_sessions.delete_one(query)
+            self.invalidate_session(session_id)
             
             if result.deleted_count > 0:
                 logger.info(f"Deleted session {session_id} for user {user_id or 'any'}")
@@ -313,6 +466,7 @@ class PolicyDatabase:
                 query["user_id"] = user_id
             
             result = await self.db.chat_sessions.delete_many(query)
+            self.invalidate_session(*session_ids)
             logger.info(f"Bulk deleted {result.deleted_count} sessions for user {user_id or 'any'}")
             return result.deleted_count
         except Exception as e:
@@ -335,6 +489,7 @@ class PolicyDatabase:
                 query["user_id"] = user_id
             
             result = await self.db.chat_sessions.delete_many(query)
+            self._session_cache.clear()
             logger.info(f"Deleted all {result.deleted_count} sessions for user {user_id or 'ALL USERS'}")
             return result.deleted_count
         except Exception as e:
@@ -381,6 +536,7 @@ class PolicyDatabase:
                 },
                 {"$set": {"user_id": user_id}}
             )
+            self.invalidate_session(*session_ids)
             logger.info(f"Migrated {result.modified_count} sessions to user {user_id}")
             return result.modified_count
         except Exception as e:
@@ -394,7 +550,7 @@ class PolicyDatabase:
             if not insights:
                 return 0
             insights_dicts = [insight.dict() for insight in insights]
-            result = await self.db.policy_insights.insert_many(insights_dicts)
+            result = await self.db.policy_insights.insert_many(insights_dicts, ordered=False)
             return len(result.inserted_ids)
         except Exception as e:
             logger.error(f"Error saving policy insights: {e}")
@@ -406,33 +562,78 @@ class PolicyDatabase:
             if not recommendations:
                 return 0
             recs_dicts = [rec.dict() for rec in recommendations]
-            result = await self.db.policy_recommendations.insert_many(recs_dicts)
+            result = await self.db.policy_recommendations.insert_many(recs_dicts, ordered=False)
             return len(result.inserted_ids)
         except Exception as e:
             logger.error(f"Error saving policy recommendations: {e}")
             return 0
 
+    def invalidate_stats(self):
+        """Drop the cached stats so the next get_database_stats reads fresh counts"""
+        self._stats_at = 0.0
+
     async def get_database_stats(self) -> dict:
-        """Get database statistics"""
-        try:
-            stats = {}
-            stats["scraped_data_count"] = await self.db.scraped_data.count_documents({})
-            stats["chat_sessions_count"] = await self.db.chat_sessions.count_documents({})
-            stats["chat_messages_count"] = await self.db.chat_messages.count_documents({})
-            stats["policy_insights_count"] = await self.db.policy_insights.count_documents({})
-            stats["policy_recommendations_count"] = await self.db.policy_recommendations.count_documents({})
-            stats["users_count"] = await self.db.users.count_documents({})
-            stats["active_sessions_count"] = await self.db.user_sessions.count_documents({})
-            
-            recent_scraping = await self.db.scraped_data.find().sort("scraped_at", -1).limit(1).to_list(length=1)
-            if recent_scraping:
-                stats["last_scraping"] = recent_scraping[0]["scraped_at"]
-            
-            return stats
-        except Exception as e:
-            logger.error(f"Error getting database stats: {e}")
-            return {}
+        """
+        Get database statistics (estimated counts read collection metadata instead of scanning).
+        Cached for STATS_CACHE_TTL_SECONDS; scraping writes invalidate it, chat counts may lag.
+        """
+        if self._stats is not None and time.monotonic() - self._stats_at < STATS_CACHE_TTL_SECONDS:
+            return dict(self._stats)
         
+        # Concurrent callers on an expired cache wait for one refresh instead of each hitting MongoDB
+        async with self._stats_lock:
+            if self._stats is not None and time.monotonic() - self._stats_at < STATS_CACHE_TTL_SECONDS:
+                return dict(self._stats)
+            try:
+                stats = {}
+                stats["scraped_data_count"] = await self.db.scraped_data.estimated_document_count()
+                stats["chat_sessions_count"] = await self.db.chat_sessions.estimated_document_count()
+                stats["chat_messages_count"] = await self.db.chat_messages.estimated_document_count()
+                stats["policy_insights_count"] = await self.db.policy_insights.estimated_document_count()
+                stats["policy_recommendations_count"] = await self.db.policy_recommendations.estimated_document_count()
+                stats["users_count"] = await self.db.users.estimated_document_count()
+                stats["active_sessions_count"] = await self.db.user_sessions.estimated_document_count()
+                stats["initial_data_count"] = await self.db.initial_data.estimated_document_count()
+                
+                recent_scraping = await self.db.scraped_data.find().sort("scraped_at", -1).limit(1).to_list(length=1)
+                if recent_scraping:
+                    stats["last_scraping"] = recent_scraping[0]["scraped_at"]
+                
+                self._stats, self._stats_at = stats, time.monotonic()
+                return dict(stats)
+            except Exception as e:
+                logger.error(f"Error getting database stats: {e}")
+                return {}
+        
+
+    # Distributed locks (shared by every API worker and the collector process)
+    async def acquire_lock(self, name: str, ttl_seconds: int) -> Optional[str]:
+        """
+        Take lock `name` for ttl_seconds unless another holder has it.
+        Returns the owner token to pass to release_lock, or None when the lock is held.
+        """
+        now = datetime.utcnow()
+        token = uuid.uuid4().hex
+        try:
+            # Matches only a missing or expired lock; a live one makes the upsert hit the unique _id
+            await self.db.locks.update_one(
+                {"_id": name, "expires_at": {"$lte": now}},
+                {"$set": {"expires_at": now + timedelta(seconds=ttl_seconds), "acquired_at": now, "owner": token}},
+                upsert=True
+            )
+            return token
+        except DuplicateKeyError:
+            return None
+
+    async def release_lock(self, name: str, token: str):
+        # Only the holder releases: after an expiry the lock may already belong to another run
+        await self.db.locks.delete_one({"_id": name, "owner": token})
+
+    async def is_locked(self, name: str) -> bool:
+        lock = await self.db.locks.find_one(
+            {"_id": name, "expires_at": {"$gt": datetime.utcnow()}}, {"_id": 1}
+        )
+        return lock is not None
 
     async def close(self):
         """Close database connection"""
@@ -0,0 +1,61 @@
+"""
+One-off migration: remove duplicate scraped_data URLs and build the unique url index.
+
+The old collector appended a new copy of every item on each run. save_scraped_data now
+upserts by url, but the unique index can't be built while duplicates exist, so the server
+falls back to a plain url index. This script keeps the most recently scraped document of
+each url, deletes the rest, and replaces the plain index with the unique one.
+
+It DELETES documents: back up scraped_data first, then run it on purpose:
+    python dedupe_scraped_urls.py            # report only
+    python dedupe_scraped_urls.py --apply    # delete duplicates + create the unique index
+"""
+
+import asyncio
+import os
+import sys
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+
+async def dedupe_scraped_urls(apply: bool) -> int:
+    mongo_url = os.environ.get('MONGO_URL')
+    if not mongo_url:
+        print("ERROR: MONGO_URL environment variable not set!")
+        return 0
+
+    client = AsyncIOMotorClient(mongo_url)
+    collection = client[os.environ.get('DB_NAME', 'policy_db')].scraped_data
+    try:
+        pipeline = [
+            {"$sort": {"scraped_at": -1}},
+            {"$group": {"_id": "$url", "ids": {"$push": "$_id"}, "count": {"$sum": 1}}},
+            {"$match": {"count": {"$gt": 1}}}
+        ]
+        duplicates = 0
+        async for group in collection.aggregate(pipeline, allowDiskUse=True):
+            stale_ids = group["ids"][1:]  # newest scraped_at first
+            duplicates += len(stale_ids)
+            if apply:
+                await collection.delete_many({"_id": {"$in": stale_ids}})
+
+        if not apply:
+            print(f"{duplicates} duplicate documents found (run with --apply to delete them)")
+            return duplicates
+        print(f"✓ Removed {duplicates} duplicate documents")
+
+        # Replace the plain fallback index (same key, same name) with the unique one
+        indexes = await collection.index_information()
+        if "url_1" in indexes and not indexes["url_1"].get("unique"):
+            await collection.drop_index("url_1")
+        await collection.create_index("url", unique=True)
+        print("✓ Unique url index created")
+        return duplicates
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    asyncio.run(dedupe_scraped_urls(apply="--apply" in sys.argv[1:]))
@@ -29,12 +29,13 @@ Pipeline per query:
 
 import os
 import re
+import asyncio
 import sys
 import json
 import uuid
 import logging
 import subprocess
-from typing import Dict, Any, List, Optional, Tuple
+from typing import Callable, Dict, Any, List, Optional, Tuple
 from dataclasses import dataclass, field
 from datetime import datetime
 from pathlib import Path
@@ -43,6 +44,8 @@ import google.generativeai as genai
 from dotenv import load_dotenv
 
 from prompt_templates import PROMPT_TEMPLATES
+from visualization_agent import VisualizationAgent
+from insight_agent import InsightGenerationAgent
 
 logger = logging.getLogger(__name__)
 
@@ -190,6 +193,34 @@ async def _call_llm(prompt: str, model_name: str = None, json_output: bool = Fal
     return text
 
 
+async def _call_llm_stream(prompt: str, on_delta: Callable[[str], None]) -> str:
+    """
+    Streaming variant of _call_llm: on_delta receives each text chunk as
+    Gemini produces it, and the full text is returned at the end.
+    The sync SDK stream is consumed in a worker thread so the event loop
+    keeps serving other requests while tokens arrive.
+    """
+    model = _get_gemini_model()
+    effective_model = os.environ.get('LLM_MODEL', 'gemini-2.0-flash-exp')
+    logger.info(f"[LLM] Streaming from model: {effective_model}")
+
+    def _consume() -> str:
+        parts = []
+        for chunk in model.generate_content(prompt, stream=True):
+            try:
+                text = chunk.text
+            except ValueError:
+                continue  # chunk without text parts (e.g. finish/safety metadata)
+            if text:
+                parts.append(text)
+                on_delta(text)
+        return ''.join(parts)
+
+    text = (await asyncio.to_thread(_consume)).strip()
+    logger.info(f"[LLM] Stream finished ({len(text)} chars)")
+    return text
+
+
 def _extract_code_block(response: str) -> str:
     """
     Extract Python code from a markdown code block.
@@ -321,7 +352,7 @@ class DataFileAnalyzerAgent:
             db = client[self.config.db_name]
             coll = db[self.config.collection_name]
 
-            count = coll.count_documents({})
+            count = coll.estimated_document_count()
             sample = coll.find_one({}, {'_id': 0})
             provinces = sorted(coll.distinct('provinsi'))
 
@@ -380,29 +411,50 @@ class DSStarOrchestrator:
     # PUBLIC ENTRY POINT
     # --------------------------------------------------------------------------
 
-    async def analyze(self, query: str, language: str = "Indonesian") -> Dict[str, Any]:
+    async def analyze(
+        self,
+        query: str,
+        language: str = "Indonesian",
+        on_event: Optional[Callable[[Dict[str, Any]], None]] = None
+    ) -> Dict[str, Any]:
         """
         Run the full DS-STAR pipeline and return the chatbot response dict.
+
+        If on_event is given it receives progress events while the pipeline runs:
+          {'type': 'status', 'phase': int, 'detail': str} at each phase start
+          {'type': 'delta', 'text': str} for narrative text as it is generated
+          {'type': 'insight', 'text': str} for each insight as soon as Gemini completes it
+            (provisional: the final response's insights list is authoritative)
+        It may be called from a worker thread.
         """
         logger.info("=" * 60)
         logger.info(f"[DS-STAR] Pipeline start: {query[:80]}")
         logger.info("=" * 60)
 
+        def status(phase: int, detail: str):
+            if on_event:
+                on_event({'type': 'status', 'phase': phase, 'detail': detail})
+
+        on_delta = (lambda text: on_event({'type': 'delta', 'text': text})) if on_event else None
+        on_insight = (lambda text: on_event({'type': 'insight', 'text': text})) if on_event else None
+
         try:
             # Non-data (conversational) queries take a shortcut
             if not self._is_data_query(query):
-                return await self._handle_conversational(query, language)
+                return await self._handle_conversational(query, language, on_delta)
 
             # ------------------------------------------------------------------
             # PHASE 1: Understand data structure
             # ------------------------------------------------------------------
             logger.info("=== PHASE 1: DATA ANALYSIS ===")
+            status(1, "data_analysis")
             data_desc = await self.analyzer.get_data_description()
 
             # ------------------------------------------------------------------
             # PHASE 2: Iterative planning, coding, execution, verification
             # ------------------------------------------------------------------
             logger.info("=== PHASE 2: ITERATIVE PLANNING & VERIFICATION ===")
+            status(2, "planning")
 
             plan: List[str] = []
             current_code: Optional[str] = None
@@ -470,6 +522,7 @@ class DSStarOrchestrator:
             # PHASE 3: Finalize — produce structured JSON
             # ------------------------------------------------------------------
             logger.info("=== PHASE 3: FINALIZATION ===")
+            status(3, "finalization")
             final_code = await self._finalizer(current_code, exec_result, query, data_desc)
             final_output = await self._execute_and_debug(final_code, data_desc)
             result_data = self._parse_json_result(final_output)
@@ -483,11 +536,12 @@ class DSStarOrchestrator:
             # PHASE 4: Response generation
             # ------------------------------------------------------------------
             logger.info("=== PHASE 4: RESPONSE GENERATION ===")
+            status(4, "response_generation")
 
-            message = await self._generate_narrative(query, final_output, language)
+            message = await self._generate_narrative(query, final_output, language, on_delta)
             visualizations = self._build_visualizations(result_data)
             insights_data = await self._generate_insights_and_policies(
-                result_data, query, language
+                result_data, query, language, on_insight
             )
 
             response = {
@@ -513,7 +567,8 @@ class DSStarOrchestrator:
                 'visualizations': [],
                 'insights': [],
                 'policies': [],
-                'supporting_data_count': 0
+                'supporting_data_count': 0,
+                'error': True  # never cached
             }
 
     # --------------------------------------------------------------------------
@@ -696,16 +751,20 @@ class DSStarOrchestrator:
     # --------------------------------------------------------------------------
 
     async def _generate_narrative(
-        self, query: str, result_json: str, language: str
+        self, query: str, result_json: str, language: str,
+        on_delta: Optional[Callable[[str], None]] = None
     ) -> str:
-        """Generate a human-readable Indonesian narrative from the JSON result."""
+        """Generate a human-readable Indonesian narrative from the JSON result (streamed to on_delta if given)."""
         try:
             prompt = PROMPT_TEMPLATES["narrative"].format(
                 question=query,
                 result_json=result_json,
                 language=language
             )
-            narrative = await _call_llm(prompt, self.config.model_name)
+            if on_delta:
+                narrative = await _call_llm_stream(prompt, on_delta)
+            else:
+                narrative = await _call_llm(prompt, self.config.model_name)
             if narrative and len(narrative) > 20:
                 return narrative
         except Exception as e:
@@ -727,7 +786,6 @@ class DSStarOrchestrator:
     def _build_visualizations(self, result_data: Dict[str, Any]) -> List[Dict[str, Any]]:
         """Build ECharts configs using the existing VisualizationAgent."""
         try:
-            from visualization_agent import VisualizationAgent
             viz_agent = VisualizationAgent()
 
             analysis_type = result_data.get('analysis_type', 'overview')
@@ -821,10 +879,12 @@ class DSStarOrchestrator:
         self,
         result_data: Dict[str, Any],
         query: str,
-        language: str
+        language: str,
+        on_insight: Optional[Callable[[str], None]] = None
     ) -> Dict[str, Any]:
         """
         GUARANTEED insight and policy generation.
+        Tier 1 insights are streamed to on_insight (if given) while Gemini generates them.
 
         Three-tier fallback strategy:
           1. Existing InsightGenerationAgent (uses Gemini with structured output)
@@ -836,7 +896,6 @@ class DSStarOrchestrator:
 
         # --- Tier 1: InsightGenerationAgent ---
         try:
-            from insight_agent import InsightGenerationAgent
             agent = InsightGenerationAgent()
 
             # Build a minimal analysis dict compatible with InsightGenerationAgent
@@ -854,7 +913,7 @@ class DSStarOrchestrator:
             aggregated = {'type': result_data.get('analysis_type', 'overview')}
 
             insight_result = await agent.generate_insights(
-                analysis, aggregated, query, language
+                analysis, aggregated, query, language, on_insight=on_insight
             )
 
             if isinstance(insight_result, dict):
@@ -893,7 +952,6 @@ class DSStarOrchestrator:
                     if isinstance(llm_insights, list) and len(llm_insights) >= 2:
                         insights = [i for i in llm_insights if isinstance(i, str)]
 
-                    from models import PolicyCategory
                     for rec in parsed.get('policy_recommendations', []):
                         if isinstance(rec, dict):
                             policies.append({
@@ -1082,7 +1140,8 @@ class DSStarOrchestrator:
         return has_data or not is_conv
 
     async def _handle_conversational(
-        self, query: str, language: str
+        self, query: str, language: str,
+        on_delta: Optional[Callable[[str], None]] = None
     ) -> Dict[str, Any]:
         """Handle non-data queries (greetings, capability questions, etc.)."""
         try:
@@ -1090,7 +1149,10 @@ class DSStarOrchestrator:
                 question=query,
                 language=language
             )
-            message = await _call_llm(prompt, self.config.model_name)
+            if on_delta:
+                message = await _call_llm_stream(prompt, on_delta)
+            else:
+                message = await _call_llm(prompt, self.config.model_name)
         except Exception:
             message = (
                 "Halo! Saya asisten analisis Sensus Ekonomi Indonesia 2016. "
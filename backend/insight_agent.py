@@ -1,37 +1,92 @@
 import google.generativeai as genai
+import asyncio
+from google.api_core import exceptions as google_exceptions
 import os
+import re
 import json
-from typing import Dict, Any, List
+import orjson
+import hashlib
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple, Callable
+from pydantic import TypeAdapter, ValidationError
 from models import PolicyRecommendation, PolicyCategory
+from aiolimiter import AsyncLimiter
+import numpy as np
+import random
 import logging
 
 logger = logging.getLogger(__name__)
 
-class InsightGenerationAgent:
-    """Agent untuk generate insights dan policy recommendations"""
-    
-    def __init__(self):
-        self.api_key = os.environ.get('GEMINI_API_KEY') or os.environ.get('GOOGLE_API_KEY')
-        if self.api_key:
-            genai.configure(api_key=self.api_key)
-        self.model_name = "gemini-2.0-flash-exp"
+# Cache respons: exact match pada (query, analisis, data) lalu semantic match pada query
+RESPONSE_CACHE_SIZE = 512
+SEMANTIC_CACHE_THRESHOLD = 0.93
+EMBEDDING_MODEL = "models/text-embedding-004"
+
+# Embedding "tertinggi" vs "terendah" hampir identik, padahal jawabannya berlawanan:
+# semantic hit hanya jika kata arah/urutan dan angka pada kedua query sama persis
+_DIRECTIONAL_TERMS = frozenset((
+    'tinggi', 'tertinggi', 'rendah', 'terendah', 'besar', 'terbesar', 'kecil', 'terkecil',
+    'banyak', 'terbanyak', 'sedikit', 'tersedikit', 'atas', 'teratas', 'bawah', 'terbawah',
+    'naik', 'turun', 'meningkat', 'menurun', 'kenaikan', 'penurunan', 'maksimum', 'minimum',
+    'highest', 'lowest', 'largest', 'smallest', 'most', 'least', 'top', 'bottom',
+    'increase', 'decrease', 'max', 'min'
+))
+_WORD_RE = re.compile(r'\w+')
+
+
+def _query_signature(query: str) -> frozenset:
+    """Kata arah/urutan dan angka di query (lihat _DIRECTIONAL_TERMS)"""
+    return frozenset(
+        token for token in _WORD_RE.findall(query.lower())
+        if token in _DIRECTIONAL_TERMS or token.isdigit()
+    )
+
+# Retry dengan exponential backoff + jitter untuk error transient (429/503)
+RETRY_LIMIT = 3
+RETRY_BASE_DELAY = 0.5
+RETRY_JITTER = 0.3
+RETRYABLE_ERRORS = (google_exceptions.ResourceExhausted, google_exceptions.ServiceUnavailable)
+
+# Token bucket per proses agar throughput tetap di bawah limit tier Gemini
+GEMINI_RATE_LIMIT = int(os.environ.get("GEMINI_RATE_LIMIT", "500"))
+GEMINI_RATE_PERIOD = 60
+
+# Mapping kategori dari output Gemini ke PolicyCategory
+_CATEGORY_MAP = {
+    'economic': PolicyCategory.ECONOMIC,
+    'social': PolicyCategory.SOCIAL,
+    'infrastructure': PolicyCategory.TECHNOLOGY,
+    'environmental': PolicyCategory.ENVIRONMENTAL,
+    'healthcare': PolicyCategory.HEALTHCARE,
+    'education': PolicyCategory.EDUCATION
+}
+
+# Validasi list rekomendasi sekaligus lewat validator pydantic-core
+_REC_ADAPTER = TypeAdapter(List[PolicyRecommendation])
+
+_INSIGHTS_ARRAY_RE = re.compile(r'"insights"\s*:\s*\[')
+
+# Batas panjang list di context Gemini (token = biaya + latensi)
+CONTEXT_MAX_LIST_ITEMS = 20
+
+
+def _trim_analysis(value: Any) -> Any:
+    """Ringkas hasil analisis sebelum dikirim ke Gemini: buang nilai kosong,
+    bulatkan float ke 2 desimal, dan potong list panjang ke 20 item teratas"""
     
-    async def generate_insights(
-        self, 
-        analysis: Dict[str, Any], 
-        aggregated_data: Dict[str, Any],
-        user_query: str,
-        language: str = "Indonesian"
-    ) -> Dict[str, Any]:
-        """Generate insights dari hasil analisis"""
-        
-        if not self.api_key:
-            return self._fallback_insights(analysis, aggregated_data)
-        
-        # Prepare context for Gemini
-        context = self._prepare_context(analysis, aggregated_data, user_query)
-        
-        system_prompt = f"""Anda adalah ahli analisis ekonomi dan kebijakan publik yang fokus pada data Sensus Ekonomi Indonesia.
+    if isinstance(value, dict):
+        return {
+            key: _trim_analysis(item)
+            for key, item in value.items()
+            if item is not None and item != [] and item != {}
+        }
+    if isinstance(value, (list, tuple)):
+        return [_trim_analysis(item) for item in value[:CONTEXT_MAX_LIST_ITEMS]]
+    if isinstance(value, float):
+        return round(value, 2)
+    return value
+
+SYSTEM_PROMPT_TEMPLATE = """Anda adalah ahli analisis ekonomi dan kebijakan publik yang fokus pada data Sensus Ekonomi Indonesia.
         
 Tugas Anda:
 1. Berikan 3-5 insight mendalam berdasarkan data yang diberikan
@@ -54,64 +109,337 @@ Format output JSON:
         }}
     ]
 }}"""
+
+
+class _InsightStreamParser:
+    """Ambil elemen array "insights" dari JSON Gemini yang masih mengalir"""
+    
+    # Sisa teks yang disimpan selama awal array "insights" belum ketemu
+    _SEARCH_TAIL = 64
+    
+    def __init__(self):
+        self._parts: List[str] = []
+        self._tail = ''  # teks yang belum diproses saja, bukan seluruh respons
+        self._in_array = False
+        self._done = False
+        self._decoder = json.JSONDecoder()
+        self.emitted = 0
+    
+    @property
+    def text(self) -> str:
+        return ''.join(self._parts)
+    
+    def feed(self, chunk: str) -> List[str]:
+        """Tambahkan potongan teks, kembalikan insight yang sudah lengkap"""
+        
+        self._parts.append(chunk)
+        found: List[str] = []
+        if self._done:
+            return found
+        
+        tail = self._tail + chunk
+        if not self._in_array:
+            match = _INSIGHTS_ARRAY_RE.search(tail)
+            if not match:
+                self._tail = tail[-self._SEARCH_TAIL:]
+                return found
+            tail = tail[match.end():]
+            self._in_array = True
+        
+        pos = 0
+        while True:
+            i = pos
+            while i < len(tail) and tail[i] in ' \t\r\n,':
+                i += 1
+            if i >= len(tail):
+                break
+            if tail[i] == ']':
+                self._done = True
+                break
+            try:
+                value, end = self._decoder.raw_decode(tail, i)
+            except ValueError:
+                break  # elemen belum selesai di-generate
+            pos = end
+            if isinstance(value, str):
+                found.append(value)
+        
+        self._tail = tail[pos:]
+        self.emitted += len(found)
+        return found
+
+
+class InsightGenerationAgent:
+    """Agent untuk generate insights dan policy recommendations"""
+    
+    # Cache respons Gemini, dipakai bersama karena agent sering dibuat ulang per request
+    _exact_cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+    _semantic_entries: "OrderedDict[str, Tuple[str, frozenset, np.ndarray]]" = OrderedDict()
+    
+    # Batas request Gemini yang berjalan bersamaan dalam satu proses
+    _semaphore = asyncio.Semaphore(int(os.environ.get("GEMINI_MAX_CONCURRENT", "20")))
+    _limiter = AsyncLimiter(max_rate=GEMINI_RATE_LIMIT, time_period=GEMINI_RATE_PERIOD)
+    
+    def __init__(self):
+        self.api_key = os.environ.get('GEMINI_API_KEY') or os.environ.get('GOOGLE_API_KEY')
+        if self.api_key:
+            genai.configure(api_key=self.api_key)
+        self.model_name = "gemini-2.0-flash-exp"
+    
+    def _build_model(self, system_prompt: str) -> genai.GenerativeModel:
+        """Build model Gemini dengan output JSON"""
+        
+        return genai.GenerativeModel(
+            model_name=self.model_name,
+            system_instruction=system_prompt,
+            generation_config={"response_mime_type": "application/json"}
+        )
+    
+    async def generate_insights(
+        self, 
+        analysis: Dict[str, Any], 
+        aggregated_data: Dict[str, Any],
+        user_query: str,
+        language: str = "Indonesian",
+        on_insight: Optional[Callable[[str], None]] = None
+    ) -> Dict[str, Any]:
+        """Generate insights dari hasil analisis.
+        
+        Jika on_insight diberikan, respons Gemini di-stream dan setiap insight dikirim ke
+        callback begitu string-nya selesai. Callback dipanggil sinkron dan tidak boleh
+        blocking (mis. queue.put_nowait), karena slot Gemini masih dipegang selama stream.
+        """
+        
+        if not self.api_key:
+            return self._fallback_insights(analysis, aggregated_data)
+        
+        cache_key, data_key = self._cache_keys(analysis, aggregated_data, user_query, language)
+        signature = _query_signature(user_query)
+        cached = self._lookup_exact(cache_key)
+        query_vector = None
+        embedding = None
+        if cached is None:
+            if self._semantic_candidates(data_key, signature):
+                query_vector = await self._embed_query(user_query)
+                cached = self._lookup_semantic(data_key, signature, query_vector)
+                if cached is not None:
+                    logger.info("Insight cache hit (semantic)")
+            else:
+                # Belum ada pembanding: vektor hanya dipakai _store_response, jadi embed paralel dengan Gemini
+                embedding = asyncio.create_task(self._embed_query(user_query))
+        if cached is not None:
+            if on_insight is not None:
+                for insight in cached['insights']:
+                    on_insight(insight)
+            return cached
+        
+        # Prepare context for Gemini
+        context = self._prepare_context(analysis, aggregated_data, user_query)
+        
+        system_prompt = SYSTEM_PROMPT_TEMPLATE.format(language=language)
         
         try:
-            model = genai.GenerativeModel(
-                model_name=self.model_name,
-                system_instruction=system_prompt,
-                generation_config={"response_mime_type": "application/json"}
-            )
+            model = self._build_model(system_prompt)
+            response_text = await self._generate_content(model, context, on_insight)
             
-            response = await model.generate_content_async(context)
-            result = json.loads(response.text)
+            result = orjson.loads(response_text)
             
             # Convert to PolicyRecommendation objects
-            recommendations = []
-            for rec in result.get('policy_recommendations', []):
-                try:
-                    category_str = rec.get('category', 'economic').lower()
-                    category_map = {
-                        'economic': PolicyCategory.ECONOMIC,
-                        'social': PolicyCategory.SOCIAL,
-                        'infrastructure': PolicyCategory.TECHNOLOGY,
-                        'environmental': PolicyCategory.ENVIRONMENTAL,
-                        'healthcare': PolicyCategory.HEALTHCARE,
-                        'education': PolicyCategory.EDUCATION
-                    }
-                    category = category_map.get(category_str, PolicyCategory.ECONOMIC)
-                    
-                    recommendations.append(PolicyRecommendation(
-                        title=rec.get('title', ''),
-                        description=rec.get('description', ''),
-                        priority=rec.get('priority', 'medium'),
-                        category=category,
-                        impact=rec.get('impact', ''),
-                        implementation_steps=rec.get('implementation_steps', [])
-                    ))
-                except Exception as e:
-                    logger.error(f"Error creating recommendation: {e}")
+            recs = [
+                {
+                    'title': rec.get('title', ''),
+                    'description': rec.get('description', ''),
+                    'priority': rec.get('priority', 'medium'),
+                    'category': _CATEGORY_MAP.get(str(rec.get('category', 'economic')).lower(), PolicyCategory.ECONOMIC),
+                    'impact': rec.get('impact', ''),
+                    'implementation_steps': rec.get('implementation_steps', [])
+                }
+                for rec in result.get('policy_recommendations', [])
+                if isinstance(rec, dict)
+            ]
+            try:
+                recommendations = _REC_ADAPTER.validate_python(recs)
+            except ValidationError:
+                # Ada item yang tidak valid: validasi satu per satu agar item lain tetap terpakai
+                recommendations = []
+                for rec in recs:
+                    try:
+                        recommendations.append(PolicyRecommendation(**rec))
+                    except ValidationError as e:
+                        logger.error(f"Error creating recommendation: {e}")
             
-            return {
+            insights_result = {
                 'insights': result.get('insights', []),
                 'policies': recommendations
             }
+            if embedding is not None:
+                query_vector = await embedding
+            self._store_response(cache_key, data_key, signature, query_vector, insights_result)
+            return insights_result
             
         except Exception as e:
+            if embedding is not None:
+                embedding.cancel()
             logger.error(f"Error generating insights with Gemini: {e}")
             return self._fallback_insights(analysis, aggregated_data)
     
+    async def generate_insights_batch(
+        self,
+        requests: List[Tuple[Dict[str, Any], Dict[str, Any], str]],
+        language: str = "Indonesian"
+    ) -> List[Any]:
+        """Generate insights untuk banyak (analysis, aggregated_data, query) sekaligus"""
+        
+        return await asyncio.gather(
+            *[self.generate_insights(analysis, data, query, language) for analysis, data, query in requests],
+            return_exceptions=True
+        )
+    
+    async def _generate_content(
+        self,
+        model: genai.GenerativeModel,
+        context: str,
+        on_insight: Optional[Callable[[str], None]] = None
+    ) -> str:
+        """Panggil Gemini lewat rate limiter + semaphore, retry dengan backoff untuk error transient"""
+        
+        for retry in range(RETRY_LIMIT + 1):
+            parser = _InsightStreamParser() if on_insight is not None else None
+            try:
+                async with self._limiter, self._semaphore:
+                    if parser is not None:
+                        return await self._stream_content(model, context, parser, on_insight)
+                    response = await model.generate_content_async(context)
+                    return response.text
+            except RETRYABLE_ERRORS as e:
+                # Insight yang sudah terkirim tidak bisa ditarik: jangan ulangi stream yang sudah jalan
+                if retry == RETRY_LIMIT or (parser is not None and parser.emitted):
+                    raise
+                delay = RETRY_BASE_DELAY * (2 ** retry) + random.uniform(0, RETRY_JITTER)
+                logger.warning(
+                    f"Transient Gemini error ({type(e).__name__}), retrying in {delay:.2f}s "
+                    f"(retry {retry + 1}/{RETRY_LIMIT})"
+                )
+                await asyncio.sleep(delay)
+    
+    async def _stream_content(
+        self,
+        model: genai.GenerativeModel,
+        context: str,
+        parser: _InsightStreamParser,
+        on_insight: Callable[[str], None]
+    ) -> str:
+        """Stream respons Gemini, kirim insight ke callback, kembalikan teks lengkap"""
+        
+        response = await model.generate_content_async(context, stream=True)
+        async for chunk in response:
+            for insight in parser.feed(chunk.text):
+                on_insight(insight)
+        return parser.text
+    
+    def _cache_keys(
+        self,
+        analysis: Dict[str, Any],
+        data: Dict[str, Any],
+        query: str,
+        language: str
+    ) -> Tuple[str, str]:
+        """Hitung key exact (query + data) dan key data saja untuk semantic cache"""
+        
+        data_json = orjson.dumps(
+            {'analysis': analysis, 'data': data, 'language': language},
+            option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS,
+            default=str
+        )
+        data_key = hashlib.blake2b(data_json, digest_size=16).hexdigest()
+        cache_key = hashlib.blake2b(
+            f"{data_key}:{query.strip().lower()}".encode('utf-8'), digest_size=16
+        ).hexdigest()
+        return cache_key, data_key
+    
+    def _lookup_exact(self, cache_key: str) -> Optional[Dict[str, Any]]:
+        cached = self._exact_cache.get(cache_key)
+        if cached is None:
+            return None
+        self._exact_cache.move_to_end(cache_key)
+        return {'insights': list(cached['insights']), 'policies': list(cached['policies'])}
+    
+    async def _embed_query(self, query: str) -> Optional[np.ndarray]:
+        """Embed query untuk semantic cache; None jika embedding gagal"""
+        
+        try:
+            response = await genai.embed_content_async(
+                model=EMBEDDING_MODEL,
+                content=query,
+                task_type="semantic_similarity"
+            )
+            vector = np.asarray(response['embedding'], dtype=np.float32)
+            norm = np.linalg.norm(vector)
+            return vector / norm if norm else None
+        except Exception as e:
+            logger.warning(f"Query embedding failed, skipping semantic cache: {e}")
+            return None
+    
+    def _semantic_candidates(self, data_key: str, signature: frozenset) -> List[str]:
+        """Key respons tersimpan dengan data analisis dan signature query yang sama"""
+        return [
+            key for key, (dkey, sig, _) in self._semantic_entries.items()
+            if dkey == data_key and sig == signature
+        ]
+    
+    def _lookup_semantic(
+        self,
+        data_key: str,
+        signature: frozenset,
+        query_vector: Optional[np.ndarray]
+    ) -> Optional[Dict[str, Any]]:
+        """Cari query mirip (cosine similarity) dengan data analisis yang sama"""
+        
+        if query_vector is None:
+            return None
+        
+        keys = self._semantic_candidates(data_key, signature)
+        if not keys:
+            return None
+        
+        vectors = np.stack([self._semantic_entries[key][2] for key in keys])
+        scores = vectors @ query_vector
+        best = int(np.argmax(scores))
+        if scores[best] < SEMANTIC_CACHE_THRESHOLD:
+            return None
+        return self._lookup_exact(keys[best])
+    
+    def _store_response(
+        self,
+        cache_key: str,
+        data_key: str,
+        signature: frozenset,
+        query_vector: Optional[np.ndarray],
+        insights_result: Dict[str, Any]
+    ):
+        self._exact_cache[cache_key] = {
+            'insights': list(insights_result['insights']),
+            'policies': list(insights_result['policies'])
+        }
+        self._exact_cache.move_to_end(cache_key)
+        if query_vector is not None:
+            self._semantic_entries[cache_key] = (data_key, signature, query_vector)
+        
+        while len(self._exact_cache) > RESPONSE_CACHE_SIZE:
+            evicted_key, _ = self._exact_cache.popitem(last=False)
+            self._semantic_entries.pop(evicted_key, None)
+    
     def _prepare_context(self, analysis: Dict[str, Any], data: Dict[str, Any], query: str) -> str:
         """Prepare context for Gemini"""
         
         data_type = data.get('type', 'unknown')
         
-        context = f"User Query: {query}\n\n"
-        context += f"Data Type: {data_type}\n\n"
-        context += "Analysis Results:\n"
-        context += json.dumps(analysis, indent=2, ensure_ascii=False)
-        context += "\n\nBerikan insights dan rekomendasi kebijakan berdasarkan analisis di atas."
-        
-        return context
+        return ''.join((
+            "User Query: ", query, "\n\n",
+            "Data Type: ", str(data_type), "\n\n",
+            "Analysis Results:\n",
+            orjson.dumps(_trim_analysis(analysis), option=orjson.OPT_NON_STR_KEYS).decode()
+        ))
     
     def _fallback_insights(self, analysis: Dict[str, Any], data: Dict[str, Any]) -> Dict[str, Any]:
         """Fallback insights jika Gemini tidak tersedia"""
@@ -1,13 +1,20 @@
-from fastapi import FastAPI, APIRouter, HTTPException, BackgroundTasks, Request, Depends
-from fastapi.responses import StreamingResponse, JSONResponse, FileResponse, HTMLResponse
+from fastapi import FastAPI, APIRouter, HTTPException, BackgroundTasks, Request, Response, Depends
+from fastapi.responses import StreamingResponse, FileResponse, ORJSONResponse
 from fastapi.staticfiles import StaticFiles
+from fastapi.middleware.gzip import GZipMiddleware
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 import os
 import logging
 from pathlib import Path
-from typing import List, Optional
+from typing import Any, AsyncIterator, Dict, List, Literal, Optional, Tuple
 import asyncio
+import hashlib
+import inspect
+from email.utils import formatdate
+from contextlib import asynccontextmanager
+import time
+import orjson
 from pydantic import BaseModel
 
 # --- 1. KONFIGURASI ENV (FIXED) ---
@@ -28,11 +35,12 @@ from models import (
     PolicyAnalysisResponse, 
     ChatSession, 
     ChatMessage,
-    ScrapedData
+    PolicyRecommendation,
+    PolicyCategory
 )
-from database import PolicyDatabase
+from database import PolicyDatabase, SCRAPE_LOCK
 from ai_analyzer_dsstar import PolicyAIAnalyzer
-from report_generator import ReportGenerator
+from report_generator import ReportGenerator, iter_report_chunks
 
 # --- 4. INISIALISASI DATABASE & AI (CRITICAL FIX) ---
 # Mengambil URL dari environment variable
@@ -48,12 +56,55 @@ policy_db = PolicyDatabase(mongo_url, db_name)
 
 # AI Analyzer akan diinit di startup event setelah database ready
 ai_analyzer = None
+# Set AI_WARMUP_ON_STARTUP=0 to skip the warm-up (e.g. local runs without an API key)
+AI_WARMUP_ON_STARTUP = os.environ.get('AI_WARMUP_ON_STARTUP', '1') != '0'
 
 # Report Generator
 report_generator = ReportGenerator()
 
 # --- 5. SETUP APLIKASI FASTAPI ---
-app = FastAPI(title="AI Policy & Insight Generator", version="1.0.0")
+# --- 6. LIFESPAN (STARTUP/SHUTDOWN) ---
+# One coroutine for the whole app lifetime instead of separate on_event callbacks
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Initialize application on startup, cleanup on shutdown"""
+    global ai_analyzer
+    try:
+        # Initialize database collections
+        await policy_db.init_collections()
+        logger.info("✓ Connected to MongoDB Atlas successfully")
+        
+        # Initialize AI Analyzer with RAW database object (not PolicyDatabase wrapper)
+        # PolicyAnalyzer expects AsyncIOMotorDatabase
+        ai_analyzer = PolicyAIAnalyzer(policy_db.db)
+        logger.info("✓ AI Analyzer initialized successfully")
+        
+        # Build the cached data context now so the first /chat doesn't pay for it
+        if AI_WARMUP_ON_STARTUP:
+            await ai_analyzer.warmup()
+        
+    except Exception as e:
+        logger.error(f"✗ Error during startup: {e}", exc_info=True)
+        raise
+    
+    _log_routes(app)
+    
+    yield
+    
+    try:
+        await policy_db.close()
+        logger.info("Application shutdown complete")
+    except Exception as e:
+        logger.error(f"Error during shutdown: {e}")
+
+
+# orjson encodes every dict/list response body (datetimes included) in C instead of json.dumps
+app = FastAPI(
+    title="AI Policy & Insight Generator",
+    version="1.0.0",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
+)
 
 # ============================================
 # CRITICAL FIX: ADD CORS MIDDLEWARE FIRST (BEFORE ANYTHING ELSE)
@@ -69,16 +120,37 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
-    expose_headers=["*"]
+    expose_headers=["*"],
+    # Preflights are answered by the middleware itself (before routing); let browsers
+    # reuse them for a day instead of re-sending OPTIONS every 10 minutes (default 600s)
+    max_age=86400
 )
 
 logger.info("✓ CORS middleware configured")
 
+# Compress JSON/HTML bodies over 1KB. SSE must reach the client chunk by chunk and
+# PDF/DOCX are already compressed (and keep their Content-Length), so those bypass it
+def _skip_gzip(path: str) -> bool:
+    return path == "/api/chat/stream" or (
+        path.startswith("/api/report/") and path.endswith(("/pdf", "/docx"))
+    )
+
+
+class _SelectiveGZipMiddleware(GZipMiddleware):
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and _skip_gzip(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+
+app.add_middleware(_SelectiveGZipMiddleware, minimum_size=1024, compresslevel=5)
+
 # Create router
 api_router = APIRouter(prefix="/api")
 
 # Global variables for background tasks
-scraping_in_progress = False
+# Scraping runs out of process and is guarded by PolicyDatabase's SCRAPE_LOCK (shared by all workers)
 last_scraping_time = None
 
 # ============================================
@@ -149,42 +221,54 @@ async def get_current_user_required(request: Request) -> dict:
     return user
 
 
-# --- 6. EVENT HANDLERS (STARTUP/SHUTDOWN) ---
-@app.on_event("startup")
-async def startup_event():
-    """Initialize application on startup"""
-    global ai_analyzer
-    try:
-        # Initialize database collections
-        await policy_db.init_collections()
-        logger.info("✓ Connected to MongoDB Atlas successfully")
-        
-        # Initialize AI Analyzer with RAW database object (not PolicyDatabase wrapper)
-        # PolicyAnalyzer expects AsyncIOMotorDatabase
-        ai_analyzer = PolicyAIAnalyzer(policy_db.db)
-        logger.info("✓ AI Analyzer initialized successfully")
-        
-    except Exception as e:
-        logger.error(f"✗ Error during startup: {e}", exc_info=True)
-        raise
+# --- FRONTEND BUILD SNAPSHOT ---
+# The build tree is immutable once deployed: list it once at import so the SPA routes
+# look files up in a dict instead of stat()-ing the filesystem on every request
+STATIC_FILES: Dict[str, Path] = (
+    {p.relative_to(FRONTEND_BUILD_PATH).as_posix(): p for p in FRONTEND_BUILD_PATH.rglob("*") if p.is_file()}
+    if FRONTEND_BUILD_PATH.is_dir() else {}
+)
+
+
+# index.html is not content-hashed: browsers must revalidate it (no-cache), but an unchanged
+# build answers with an empty 304 and the bytes are served from memory
+def _read_index() -> Optional[Tuple[bytes, str, str]]:
+    """(index.html bytes, strong ETag, Last-Modified), or None if the frontend isn't built"""
+    index_path = STATIC_FILES.get("index.html")
+    if index_path is None:
+        return None
+    body = index_path.read_bytes()
+    last_modified = formatdate(index_path.stat().st_mtime, usegmt=True)
+    return body, f'"{hashlib.sha256(body).hexdigest()[:32]}"', last_modified
+
+
+_INDEX = _read_index()
+
+
+def _index_response(request: Request, index: Tuple[bytes, str, str]) -> Response:
+    body, etag, last_modified = index
+    headers = {"ETag": etag, "Last-Modified": last_modified, "Cache-Control": "no-cache"}
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="text/html", headers=headers)
+
+
+class _ImmutableStaticFiles(StaticFiles):
+    """CRA build assets under /static carry a content hash in their name, so they never change"""
+    
+    def file_response(self, *args, **kwargs) -> Response:
+        response = super().file_response(*args, **kwargs)
+        response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+        return response
 
-@app.on_event("shutdown")
-async def shutdown_event():
-    """Cleanup on shutdown"""
-    try:
-        await policy_db.close()
-        logger.info("Application shutdown complete")
-    except Exception as e:
-        logger.error(f"Error during shutdown: {e}")
 
 # --- 7. ROOT ENDPOINT (HEALTH CHECK) ---
 @app.get("/")
-async def root():
+async def root(request: Request):
     """Root endpoint - serve SPA or API info"""
     # Check if frontend build exists
-    index_path = FRONTEND_BUILD_PATH / "index.html"
-    if index_path.exists():
-        return FileResponse(index_path, media_type="text/html")
+    if _INDEX:
+        return _index_response(request, _INDEX)
     
     # Fallback to API info if no frontend
     return {
@@ -205,21 +289,36 @@ async def root():
 async def api_root():
     return {"message": "API is running", "version": "1.0.0"}
 
+# Probes and the dashboard hit /health every few seconds: a healthy result is reused for _HEALTH_TTL seconds
+_HEALTH_TTL = 10.0
+_health_cache = (0.0, None)
+
+
 @api_router.get("/health")
 async def health_check():
+    global _health_cache
     try:
-        stats = await policy_db.get_database_stats()
-        return {
+        expires_at, cached = _health_cache
+        if cached is not None and time.monotonic() < expires_at:
+            return cached
+        
+        stats, scraping = await asyncio.gather(
+            policy_db.get_database_stats(),
+            policy_db.is_locked(SCRAPE_LOCK)
+        )
+        health = {
             "status": "healthy",
             "database": "connected" if policy_db.is_connected else "disconnected",
             "ai_analyzer": "ready" if ai_analyzer else "not_initialized",
-            "scraping_status": "in_progress" if scraping_in_progress else "idle",
+            "scraping_status": "in_progress" if scraping else "idle",
             "last_scraping": last_scraping_time,
             "data_stats": stats
         }
+        _health_cache = (time.monotonic() + _HEALTH_TTL, health)
+        return health
     except Exception as e:
         logger.error(f"Health check failed: {e}")
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=503,
             content={"status": "unhealthy", "error": str(e)}
         )
@@ -229,6 +328,128 @@ async def health_check():
 # CHAT ENDPOINTS - NOW WITH USER AUTHENTICATION
 # ============================================
 
+def _analysis_cache_key(message: str, language: str, data_fingerprint: str) -> str:
+    """Exact-match key for /chat: normalized question + language + analysed-data fingerprint"""
+    normalized = " ".join(message.lower().split())
+    return hashlib.blake2b(
+        f"{normalized}|{language}|{data_fingerprint}".encode("utf-8"), digest_size=32
+    ).hexdigest()
+
+
+async def _lookup_cached_analysis(message: str, language: str):
+    """Return (cache_key, cached analysis_result or None); cache_key is None when data can't be fingerprinted"""
+    fingerprint = await ai_analyzer.data_fingerprint()
+    if not fingerprint:
+        return None, None
+    cache_key = _analysis_cache_key(message, language, fingerprint)
+    return cache_key, await policy_db.get_cached_analysis(cache_key)
+
+
+async def _resolve_chat_session(session_id: Optional[str], http_request: Request) -> str:
+    """
+    Return the session to write this chat turn to
+    
+    - Creates a session (owned by the current user, if any) when none is given or it doesn't exist
+    - Raises 403 for another user's session; claims an anonymous session for a logged-in user
+    """
+    # Get current user and the requested session together (independent round-trips)
+    current_user, existing_session = await asyncio.gather(
+        get_current_user_from_request(http_request),
+        policy_db.get_chat_session(session_id) if session_id else asyncio.sleep(0)
+    )
+    user_id = current_user.get("user_id") if current_user else None
+    
+    logger.info(f"📝 Chat request - User: {user_id or 'anonymous'}, Session: {session_id or 'new'}")
+    
+    if not session_id:
+        # Create new session with user_id
+        session = await policy_db.create_chat_session(user_id=user_id)
+        logger.info(f"✓ Created new session {session.id} for user {user_id or 'anonymous'}")
+        return session.id
+    
+    # Verify session exists and user has access
+    if not existing_session:
+        # Session doesn't exist, create new one
+        session = await policy_db.create_chat_session(user_id=user_id)
+        logger.info(f"✓ Session not found, created new session {session.id}")
+        return session.id
+    
+    # Session exists, check ownership
+    session_owner = existing_session.user_id
+    
+    if session_owner and user_id and session_owner != user_id:
+        # Session belongs to different user
+        raise HTTPException(status_code=403, detail="Access denied to this session")
+    
+    # If session is anonymous (no owner) and user is logged in,
+    # optionally claim the session
+    if not session_owner and user_id:
+        # Claim anonymous session for logged-in user
+        await policy_db.db.chat_sessions.update_one(
+            {"id": session_id},
+            {"$set": {"user_id": user_id}}
+        )
+        policy_db.invalidate_session(session_id)
+        logger.info(f"✓ Claimed anonymous session {session_id} for user {user_id}")
+    
+    logger.info(f"✓ Using existing session {session_id}")
+    return session_id
+
+
+def _queue_chat_persistence(
+    background_tasks: BackgroundTasks,
+    user_message: ChatMessage,
+    analysis_result: dict,
+    cache_key: Optional[str],
+    cache_miss: bool
+):
+    """
+    Persist a chat turn after the response is sent (persistence doesn't change the response).
+    Both messages go in one $push, user message first.
+    """
+    ai_message = ChatMessage(
+        session_id=user_message.session_id,
+        sender="ai",
+        content=analysis_result['message'],
+        visualizations=analysis_result.get('visualizations', []),
+        insights=analysis_result.get('insights', []),
+        policies=analysis_result.get('policies', [])
+    )
+    
+    # Convert dict policies to PolicyRecommendation objects
+    policy_objects = []
+    for policy_dict in analysis_result.get('policies') or []:
+        try:
+            policy_obj = PolicyRecommendation(
+                title=policy_dict.get('title', ''),
+                description=policy_dict.get('description', ''),
+                priority=policy_dict.get('priority', 'medium'),
+                category=PolicyCategory(policy_dict.get('category', 'economic')),
+                impact=policy_dict.get('impact', ''),
+                implementation_steps=policy_dict.get('implementation_steps', [])
+            )
+            policy_objects.append(policy_obj)
+        except Exception as e:
+            logger.error(f"Error creating policy object: {e}")
+    
+    background_tasks.add_task(policy_db.save_chat_messages, [user_message, ai_message])
+    if policy_objects:
+        background_tasks.add_task(policy_db.save_policy_recommendations, policy_objects)
+    if cache_miss and cache_key and not analysis_result.get('error'):
+        background_tasks.add_task(policy_db.save_cached_analysis, cache_key, analysis_result)
+
+
+def _analysis_response(session_id: str, analysis_result: dict) -> PolicyAnalysisResponse:
+    return PolicyAnalysisResponse(
+        message=analysis_result['message'],
+        session_id=session_id,
+        visualizations=analysis_result.get('visualizations', []),
+        insights=analysis_result.get('insights', []),
+        policies=analysis_result.get('policies', []),
+        supporting_data_count=analysis_result.get('supporting_data_count', 0)
+    )
+
+
 @api_router.post("/chat", response_model=PolicyAnalysisResponse)
 async def analyze_policy(
     request: PolicyAnalysisRequest, 
@@ -245,106 +466,41 @@ async def analyze_policy(
         if not ai_analyzer:
             raise HTTPException(status_code=503, detail="AI Analyzer not initialized")
         
-        # Get current user from request
-        current_user = await get_current_user_from_request(http_request)
-        user_id = current_user.get("user_id") if current_user else None
-        
-        logger.info(f"📝 Chat request - User: {user_id or 'anonymous'}, Message: {request.message[:50]}...")
-        
-        # Get or create session
-        session_id = request.session_id
-        if not session_id:
-            # Create new session with user_id
-            session = await policy_db.create_chat_session(user_id=user_id)
-            session_id = session.id
-            logger.info(f"✓ Created new session {session_id} for user {user_id or 'anonymous'}")
-        else:
-            # Verify session exists and user has access
-            existing_session = await policy_db.get_chat_session(session_id)
-            
-            if not existing_session:
-                # Session doesn't exist, create new one
-                session = await policy_db.create_chat_session(user_id=user_id)
-                session_id = session.id
-                logger.info(f"✓ Session not found, created new session {session_id}")
-            else:
-                # Session exists, check ownership
-                session_owner = existing_session.user_id
-                
-                if session_owner and user_id and session_owner != user_id:
-                    # Session belongs to different user
-                    raise HTTPException(status_code=403, detail="Access denied to this session")
-                
-                # If session is anonymous (no owner) and user is logged in,
-                # optionally claim the session
-                if not session_owner and user_id:
-                    # Claim anonymous session for logged-in user
-                    await policy_db.db.chat_sessions.update_one(
-                        {"id": session_id},
-                        {"$set": {"user_id": user_id}}
-                    )
-                    logger.info(f"✓ Claimed anonymous session {session_id} for user {user_id}")
-                
-                logger.info(f"✓ Using existing session {session_id}")
+        # Session resolution and the cache lookup are independent round-trips; run them together.
+        # Identical questions against unchanged data reuse the stored analysis instead of rerunning the LLM
+        session_id, (cache_key, analysis_result) = await asyncio.gather(
+            _resolve_chat_session(request.session_id, http_request),
+            _lookup_cached_analysis(request.message, "Indonesian")
+        )
 
-        # Save user message
+        # User message (persisted after the response)
         user_message = ChatMessage(
             session_id=session_id,
             sender="user",
             content=request.message
         )
-        await policy_db.save_chat_message(user_message)
         
-        # Analyze with AI using multi-agent system
-        analysis_result = await ai_analyzer.analyze_policy_query(
-            query=request.message,
-            language="Indonesian",
-            scraped_data=None  # Not used - agents get data from initial_data
-        )
-        
-        logger.info(f"✓ Analysis completed for session {session_id}")
+        cache_miss = analysis_result is None
         
-        # Save AI response
-        ai_message = ChatMessage(
-            session_id=session_id,
-            sender="ai",
-            content=analysis_result['message'],
-            visualizations=analysis_result.get('visualizations', []),
-            insights=analysis_result.get('insights', []),
-            policies=analysis_result.get('policies', [])
-        )
-        await policy_db.save_chat_message(ai_message)
-        
-        # Save recommendations if any
-        if analysis_result.get('policies'):
-            # Convert dict policies to PolicyRecommendation objects
-            from models import PolicyRecommendation, PolicyCategory
-            policy_objects = []
-            for policy_dict in analysis_result['policies']:
-                try:
-                    policy_obj = PolicyRecommendation(
-                        title=policy_dict.get('title', ''),
-                        description=policy_dict.get('description', ''),
-                        priority=policy_dict.get('priority', 'medium'),
-                        category=PolicyCategory(policy_dict.get('category', 'economic')),
-                        impact=policy_dict.get('impact', ''),
-                        implementation_steps=policy_dict.get('implementation_steps', [])
-                    )
-                    policy_objects.append(policy_obj)
-                except Exception as e:
-                    logger.error(f"Error creating policy object: {e}")
+        if not cache_miss:
+            logger.info(f"✓ Analysis cache hit for session {session_id}")
+        else:
+            # Analyze with AI using multi-agent system
+            try:
+                analysis_result = await ai_analyzer.analyze_policy_query(
+                    query=request.message,
+                    language="Indonesian",
+                    scraped_data=None  # Not used - agents get data from initial_data
+                )
+            except Exception:
+                # Background tasks don't run on the error response: keep the user's message now
+                await policy_db.save_chat_message(user_message)
+                raise
             
-            if policy_objects:
-                await policy_db.save_policy_recommendations(policy_objects)
+            logger.info(f"✓ Analysis completed for session {session_id}")
         
-        return PolicyAnalysisResponse(
-            message=analysis_result['message'],
-            session_id=session_id,
-            visualizations=analysis_result.get('visualizations', []),
-            insights=analysis_result.get('insights', []),
-            policies=analysis_result.get('policies', []),
-            supporting_data_count=analysis_result.get('supporting_data_count', 0)
-        )
+        _queue_chat_persistence(background_tasks, user_message, analysis_result, cache_key, cache_miss)
+        return _analysis_response(session_id, analysis_result)
         
     except HTTPException:
         raise
@@ -353,7 +509,134 @@ async def analyze_policy(
         raise HTTPException(status_code=500, detail=f"Error analyzing policy: {str(e)}")
 
 
-@api_router.get("/sessions", response_model=List[ChatSession])
+def _sse(event: dict) -> bytes:
+    return b"data: " + orjson.dumps(event, default=str) + b"\n\n"
+
+
+async def _replay_analysis(analysis_result: dict) -> AsyncIterator[dict]:
+    """Cached analyses are sent as one delta plus the result, same shape as a live stream"""
+    yield {"type": "delta", "text": analysis_result["message"]}
+    yield {"type": "result", **analysis_result}
+
+
+@api_router.post("/chat/stream")
+async def analyze_policy_stream(
+    request: PolicyAnalysisRequest,
+    http_request: Request,
+    background_tasks: BackgroundTasks
+):
+    """
+    Same as /chat, streamed as Server-Sent Events (text/event-stream)
+    
+    Events (JSON in each `data:` line):
+    - {"type": "session", "session_id"} first
+    - {"type": "status", "phase", "detail"} as the analysis pipeline progresses
+    - {"type": "delta", "text"} message text as it is generated
+    - {"type": "insight", "text"} each insight as it is completed (provisional)
+    - {"type": "result", ...PolicyAnalysisResponse} last; its message and insights are authoritative
+    """
+    if not ai_analyzer:
+        raise HTTPException(status_code=503, detail="AI Analyzer not initialized")
+    
+    session_id, (cache_key, cached_result) = await asyncio.gather(
+        _resolve_chat_session(request.session_id, http_request),
+        _lookup_cached_analysis(request.message, "Indonesian")
+    )
+    user_message = ChatMessage(
+        session_id=session_id,
+        sender="user",
+        content=request.message
+    )
+    
+    async def event_source():
+        persisted = False
+        try:
+            yield _sse({"type": "session", "session_id": session_id})
+            if cached_result is not None:
+                logger.info(f"✓ Analysis cache hit for session {session_id}")
+                events = _replay_analysis(cached_result)
+            else:
+                events = ai_analyzer.analyze_policy_query_stream(request.message, "Indonesian")
+            
+            async for event in events:
+                if event["type"] == "result":
+                    analysis_result = {k: v for k, v in event.items() if k != "type"}
+                    _queue_chat_persistence(
+                        background_tasks, user_message, analysis_result, cache_key, cached_result is None
+                    )
+                    persisted = True
+                    event = {
+                        "type": "result",
+                        **_analysis_response(session_id, analysis_result).model_dump(mode="json")
+                    }
+                yield _sse(event)
+        finally:
+            # Stream cut short (client left or error): still keep the user's message
+            if not persisted:
+                background_tasks.add_task(policy_db.save_chat_message, user_message)
+    
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+def _json_bytes(doc: dict) -> bytes:
+    # Null top-level fields are dropped, like response_model_exclude_none on the non-streamed lists
+    return orjson.dumps({k: v for k, v in doc.items() if v is not None}, default=str)
+
+
+async def _stream_json_array(first: dict, docs: AsyncIterator[dict]) -> AsyncIterator[bytes]:
+    """Serialize documents as a chunked JSON array while the cursor is still being read"""
+    yield b"[" + _json_bytes(first)
+    try:
+        async for doc in docs:
+            yield b"," + _json_bytes(doc)
+    except Exception as e:
+        # Headers are already sent; abort the stream rather than emit a truncated array
+        logger.error(f"❌ Error streaming documents: {e}")
+        raise
+    yield b"]"
+
+
+async def _json_array_response(docs: AsyncIterator[dict], headers: Optional[dict] = None) -> Response:
+    """
+    Stream `docs` as a JSON array. The first document is read before the response starts,
+    so a failing query still raises inside the route (-> 500) instead of a cut-off 200.
+    """
+    try:
+        first = await docs.__anext__()
+    except StopAsyncIteration:
+        return Response(b"[]", media_type="application/json", headers=headers)
+    return StreamingResponse(
+        _stream_json_array(first, docs),
+        media_type="application/json",
+        headers=headers
+    )
+
+
+def _streamed_array(model_name: str) -> dict:
+    """OpenAPI entry for routes answering with _json_array_response (no response_model: nothing is validated)"""
+    return {200: {"description": f"JSON array of raw {model_name} documents, streamed; null fields omitted"}}
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    """If-None-Match check with weak comparison (GET/HEAD semantics)"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    tags = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    return etag.removeprefix("W/") in tags
+
+
+def _not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag})
+
+
+@api_router.get("/sessions", responses=_streamed_array("ChatSession"))
 async def get_chat_sessions(request: Request):
     """
     Get chat sessions for the current user
@@ -370,10 +653,8 @@ async def get_chat_sessions(request: Request):
             logger.info("📋 Anonymous user requesting sessions - returning empty list")
             return []
         
-        logger.info(f"📋 Fetching sessions for user {user_id}...")
-        sessions = await policy_db.get_chat_sessions(limit=20, user_id=user_id)
-        logger.info(f"✓ Found {len(sessions)} sessions for user {user_id}")
-        return sessions
+        logger.info(f"📋 Streaming sessions for user {user_id}...")
+        return await _json_array_response(policy_db.iter_chat_sessions(limit=20, user_id=user_id))
     except Exception as e:
         logger.error(f"❌ Error fetching sessions: {e}")
         raise HTTPException(status_code=500, detail="Error fetching sessions")
@@ -500,6 +781,34 @@ async def delete_all_sessions(request: Request):
 # REPORT ENDPOINTS - WITH USER AUTHENTICATION
 # ============================================
 
+def _buffered_report(buffer):
+    """Chunk iterator over a rendered report plus its size, so the download gets a Content-Length"""
+    size = buffer.seek(0, os.SEEK_END)
+    buffer.seek(0)
+    return iter_report_chunks(buffer), size
+
+
+async def _render_pdf_report(session):
+    return _buffered_report(await report_generator.generate_pdf_async(session))
+
+
+async def _render_docx_report(session):
+    return _buffered_report(await report_generator.generate_docx_async(session))
+
+
+async def _render_html_report(session):
+    # Streamed in chunks as the report is rendered (length unknown up front)
+    return await report_generator.iter_html_report_bytes_async(session), None
+
+
+# format (also the file extension) -> (renderer returning (body iterator, size or None), media type)
+_REPORT_FORMATS = {
+    'pdf': (_render_pdf_report, 'application/pdf'),
+    'docx': (_render_docx_report, 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'),
+    'html': (_render_html_report, 'text/html; charset=utf-8'),
+}
+
+
 @api_router.get("/report/{session_id}/{format}")
 async def generate_report(session_id: str, format: str, request: Request):
     """
@@ -512,18 +821,21 @@ async def generate_report(session_id: str, format: str, request: Request):
     """
     try:
         # Validate format
-        if format not in ['pdf', 'docx', 'html']:
+        spec = _REPORT_FORMATS.get(format)
+        if spec is None:
             raise HTTPException(
                 status_code=400, 
                 detail="Format must be 'pdf', 'docx', or 'html'"
             )
+        render, media_type = spec
         
-        current_user = await get_current_user_from_request(request)
+        # Auth lookup and session fetch are independent round-trips; run them together
+        current_user, session = await asyncio.gather(
+            get_current_user_from_request(request),
+            policy_db.get_chat_session(session_id)
+        )
         user_id = current_user.get("user_id") if current_user else None
         
-        # Get session with access check
-        session = await policy_db.get_chat_session(session_id)
-        
         if not session:
             raise HTTPException(status_code=404, detail="Session not found")
         
@@ -533,45 +845,15 @@ async def generate_report(session_id: str, format: str, request: Request):
         
         logger.info(f"Generating {format} report for session {session_id}")
         
-        if format == 'pdf':
-            buffer = report_generator.generate_pdf(session)
-            media_type = 'application/pdf'
-            filename = f"Laporan_Sensus_Ekonomi_{session_id[:8]}.pdf"
-            
-            return StreamingResponse(
-                buffer,
-                media_type=media_type,
-                headers={
-                    'Content-Disposition': f'attachment; filename="{filename}"',
-                    'Access-Control-Expose-Headers': 'Content-Disposition'
-                }
-            )
-        
-        elif format == 'docx':
-            buffer = report_generator.generate_docx(session)
-            media_type = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
-            filename = f"Laporan_Sensus_Ekonomi_{session_id[:8]}.docx"
-            
-            return StreamingResponse(
-                buffer,
-                media_type=media_type,
-                headers={
-                    'Content-Disposition': f'attachment; filename="{filename}"',
-                    'Access-Control-Expose-Headers': 'Content-Disposition'
-                }
-            )
-        
-        else:  # html
-            html_content = report_generator.generate_html_report(session)
-            
-            # Return as downloadable HTML file
-            return HTMLResponse(
-                content=html_content,
-                headers={
-                    'Content-Disposition': f'attachment; filename="Laporan_Sensus_Ekonomi_{session_id[:8]}.html"',
-                    'Access-Control-Expose-Headers': 'Content-Disposition'
-                }
-            )
+        body, size = await render(session)
+        filename = f"Laporan_Sensus_Ekonomi_{session_id[:8]}.{format}"
+        headers = {
+            'Content-Disposition': f'attachment; filename="{filename}"',
+            'Access-Control-Expose-Headers': 'Content-Disposition'
+        }
+        if size is not None:
+            headers['Content-Length'] = str(size)
+        return StreamingResponse(body, media_type=media_type, headers=headers)
     
     except HTTPException:
         raise
@@ -586,11 +868,12 @@ async def preview_report(session_id: str, request: Request):
     Preview report as HTML in browser (tidak download, langsung tampil)
     """
     try:
-        current_user = await get_current_user_from_request(request)
+        current_user, session = await asyncio.gather(
+            get_current_user_from_request(request),
+            policy_db.get_chat_session(session_id)
+        )
         user_id = current_user.get("user_id") if current_user else None
         
-        session = await policy_db.get_chat_session(session_id)
-        
         if not session:
             raise HTTPException(status_code=404, detail="Session not found")
         
@@ -598,10 +881,11 @@ async def preview_report(session_id: str, request: Request):
         if session.user_id and session.user_id != user_id:
             raise HTTPException(status_code=403, detail="Access denied to this session")
         
-        html_content = report_generator.generate_html_report(session)
-        
-        # Return as viewable HTML (tanpa Content-Disposition attachment)
-        return HTMLResponse(content=html_content)
+        # Return as viewable HTML (tanpa Content-Disposition attachment), streamed in chunks
+        return StreamingResponse(
+            await report_generator.iter_html_report_bytes_async(session),
+            media_type='text/html; charset=utf-8'
+        )
     
     except HTTPException:
         raise
@@ -673,7 +957,7 @@ async def debug_sessions(request: Request):
             })
         
         # Get total sessions in database
-        total_sessions = await policy_db.db.chat_sessions.count_documents({})
+        total_sessions = await policy_db.db.chat_sessions.estimated_document_count()
         
         # Get sample of all sessions to see user_id distribution
         sample_sessions = await policy_db.db.chat_sessions.find(
@@ -718,44 +1002,122 @@ async def trigger_scraping(background_tasks: BackgroundTasks):
         "status": "not_needed"
     }
 
-@api_router.get("/data/recent", response_model=List[ScrapedData])
-async def get_recent_data(limit: int = 50, category: Optional[str] = None):
+@api_router.get("/data/recent", responses=_streamed_array("ScrapedData"))
+async def get_recent_data(request: Request, limit: int = 50, category: Optional[str] = None):
     try:
-        data = await policy_db.get_recent_scraped_data(limit=limit, category=category)
-        return data
+        # Every save stamps scraped_at and nothing deletes scraped data, so the newest
+        # timestamp versions the list; pollers get a 304 after one indexed lookup
+        latest = await policy_db.latest_scraped_at(category)
+        version = hashlib.blake2b(f"{latest}|{limit}|{category}".encode("utf-8"), digest_size=8).hexdigest()
+        etag = f'W/"{version}"'
+        if _etag_matches(request, etag):
+            return _not_modified(etag)
+        
+        return await _json_array_response(
+            policy_db.iter_recent_scraped_data(limit=limit, category=category),
+            headers={"ETag": etag}
+        )
     except Exception as e:
         logger.error(f"Error fetching recent data: {e}")
         raise HTTPException(status_code=500, detail="Error fetching data")
 
-@api_router.get("/data/search", response_model=List[ScrapedData])
+@api_router.get("/data/search", responses=_streamed_array("ScrapedData"))
 async def search_data(query: str, limit: int = 50):
     try:
-        data = await policy_db.search_scraped_data(query, limit=limit)
-        return data
+        return await _json_array_response(policy_db.iter_search_scraped_data(query, limit=limit))
     except Exception as e:
         logger.error(f"Error searching data: {e}")
         raise HTTPException(status_code=500, detail="Error searching data")
 
-@api_router.get("/stats")
-async def get_stats():
+async def _stats_payload() -> dict:
     try:
+        # Counts come from PolicyDatabase's short-lived stats cache (collection metadata, no scan)
         stats = await policy_db.get_database_stats()
         stats["scraping_status"] = "deprecated"
         stats["last_scraping"] = last_scraping_time
-        
-        # Add initial_data stats
-        try:
-            initial_data_count = await policy_db.db.initial_data.count_documents({})
-            stats["initial_data_count"] = initial_data_count
-        except:
-            stats["initial_data_count"] = 0
-        
+        stats.setdefault("initial_data_count", 0)
         return stats
     except Exception as e:
         logger.error(f"Error getting stats: {e}")
         raise HTTPException(status_code=500, detail="Error getting statistics")
 
 
+@api_router.get("/stats")
+async def get_stats(request: Request):
+    # Content hash ETag: unchanged stats are answered with an empty 304
+    body = orjson.dumps(await _stats_payload(), default=str)
+    etag = f'"{hashlib.blake2b(body, digest_size=8).hexdigest()}"'
+    if _etag_matches(request, etag):
+        return _not_modified(etag)
+    return Response(body, media_type="application/json", headers={"ETag": etag})
+
+
+# ============================================
+# BATCH ENDPOINT - several reads in one round-trip
+# ============================================
+
+_BATCH_MAX_REQUESTS = 10
+
+
+class BatchSubRequest(BaseModel):
+    op: Literal["session", "recent", "stats"]
+    params: Dict[str, Any] = {}
+
+
+class BatchRequest(BaseModel):
+    requests: Dict[str, BatchSubRequest]
+
+
+async def _batch_recent(request: Request, limit: int = 50, category: Optional[str] = None) -> list:
+    return [doc async for doc in policy_db.iter_recent_scraped_data(limit=limit, category=category)]
+
+
+# op -> handler(request, **params); each reuses the same access checks as its endpoint
+_BATCH_HANDLERS = {
+    "session": lambda request, session_id: get_chat_session(session_id, request),
+    "recent": _batch_recent,
+    "stats": lambda request: _stats_payload(),
+}
+
+
+async def _run_batch_item(item: BatchSubRequest, request: Request) -> dict:
+    handler = _BATCH_HANDLERS[item.op]
+    # Check the params against the handler first: a TypeError raised inside it is a server bug
+    try:
+        inspect.signature(handler).bind(request, **item.params)
+    except TypeError as e:
+        return {"status": 400, "detail": f"Invalid params for '{item.op}': {e}"}
+    try:
+        body = await handler(request, **item.params)
+        return {"status": 200, "body": body}
+    except HTTPException as e:
+        return {"status": e.status_code, "detail": e.detail}
+    except Exception as e:
+        logger.error(f"❌ Batch sub-request '{item.op}' failed: {e}")
+        return {"status": 500, "detail": f"Error running '{item.op}'"}
+
+
+@api_router.post("/batch")
+async def batch(batch_request: BatchRequest, request: Request):
+    """
+    Run several read requests in one HTTP round-trip
+    
+    Body: {"requests": {"<name>": {"op": "session|recent|stats", "params": {...}}}}
+    Sub-requests run concurrently; each gets its own status in {"responses": {"<name>": ...}}
+    """
+    if len(batch_request.requests) > _BATCH_MAX_REQUESTS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {_BATCH_MAX_REQUESTS} sub-requests per batch"
+        )
+    
+    names = list(batch_request.requests)
+    results = await asyncio.gather(
+        *(_run_batch_item(batch_request.requests[name], request) for name in names)
+    )
+    return {"responses": dict(zip(names, results))}
+
+
 # --- 9. REGISTER API ROUTER ---
 app.include_router(api_router)
 logger.info("✓ API routes registered at /api/*")
@@ -772,7 +1134,7 @@ except ImportError as e:
     # Fallback auth endpoint for testing
     @app.get("/api/auth/me")
     async def fallback_auth_me():
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=401,
             content={"detail": "Auth module not loaded"}
         )
@@ -788,7 +1150,7 @@ async def not_found_handler(request: Request, exc):
     # If it's an API call, return JSON error
     if path.startswith("/api/"):
         logger.warning(f"404 API endpoint not found: {path}")
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=404,
             content={
                 "detail": f"API endpoint not found: {path}",
@@ -804,14 +1166,13 @@ async def not_found_handler(request: Request, exc):
     
     # For ALL non-API paths, serve index.html (SPA routing)
     # This handles /login, /register, /dashboard, /auth/callback, etc.
-    index_path = FRONTEND_BUILD_PATH / "index.html"
-    if index_path.exists():
+    if _INDEX:
         logger.info(f"Serving SPA index.html for path: {path}")
-        return FileResponse(index_path, media_type="text/html")
+        return _index_response(request, _INDEX)
     
     # Only return 404 if index.html doesn't exist
-    logger.error(f"Frontend index.html not found at {index_path}")
-    return JSONResponse(
+    logger.error(f"Frontend index.html not found at {FRONTEND_BUILD_PATH / 'index.html'}")
+    return ORJSONResponse(
         status_code=404,
         content={"detail": "Frontend not deployed. Please build the frontend first."}
     )
@@ -820,14 +1181,14 @@ async def not_found_handler(request: Request, exc):
 async def internal_error_handler(request: Request, exc):
     """Custom 500 handler"""
     logger.error(f"500 Internal Error at {request.url.path}: {exc}", exc_info=True)
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=500,
         content={"detail": "Internal server error", "path": request.url.path}
     )
 
 # --- 12. STATIC FILES & SPA FALLBACK (FOR PRODUCTION) ---
 # Check if frontend build exists
-if FRONTEND_BUILD_PATH.exists() and (FRONTEND_BUILD_PATH / "index.html").exists():
+if _INDEX:
     logger.info(f"✓ Frontend build found at: {FRONTEND_BUILD_PATH}")
     
     # Serve static files (JS, CSS, images, etc) - MUST be before catch-all
@@ -835,33 +1196,30 @@ if FRONTEND_BUILD_PATH.exists() and (FRONTEND_BUILD_PATH / "index.html").exists(
     if static_path.exists():
         app.mount(
             "/static",
-            StaticFiles(directory=str(static_path)),
+            _ImmutableStaticFiles(directory=str(static_path)),
             name="static"
         )
         logger.info("✓ Static files mounted at /static")
     
     @app.get("/favicon.ico")
     async def favicon():
-        favicon_path = FRONTEND_BUILD_PATH / "favicon.ico"
-        if favicon_path.exists():
+        # Try .ico first, then the .png version
+        favicon_path = STATIC_FILES.get("favicon.ico") or STATIC_FILES.get("favicon.png")
+        if favicon_path:
             return FileResponse(favicon_path)
-        # Try .png version
-        favicon_png = FRONTEND_BUILD_PATH / "favicon.png"
-        if favicon_png.exists():
-            return FileResponse(favicon_png)
         raise HTTPException(status_code=404)
 
     @app.get("/manifest.json")
     async def manifest():
-        manifest_path = FRONTEND_BUILD_PATH / "manifest.json"
-        if manifest_path.exists():
+        manifest_path = STATIC_FILES.get("manifest.json")
+        if manifest_path:
             return FileResponse(manifest_path)
         raise HTTPException(status_code=404)
 
     @app.get("/robots.txt")
     async def robots():
-        robots_path = FRONTEND_BUILD_PATH / "robots.txt"
-        if robots_path.exists():
+        robots_path = STATIC_FILES.get("robots.txt")
+        if robots_path:
             return FileResponse(robots_path)
         raise HTTPException(status_code=404)
     
@@ -881,16 +1239,15 @@ if FRONTEND_BUILD_PATH.exists() and (FRONTEND_BUILD_PATH / "index.html").exists(
             raise HTTPException(status_code=404, detail="API endpoint not found")
         
         # Check if it's a static file request
-        static_file = FRONTEND_BUILD_PATH / full_path
-        if static_file.exists() and static_file.is_file():
+        static_file = STATIC_FILES.get(full_path)
+        if static_file:
             return FileResponse(static_file)
         
         # Serve index.html untuk semua SPA routes
         # This handles: /login, /register, /dashboard, /auth/callback, etc.
-        index_path = FRONTEND_BUILD_PATH / "index.html"
-        if index_path.exists():
+        if _INDEX:
             logger.info(f"Serving SPA for route: /{full_path}")
-            return FileResponse(index_path, media_type="text/html")
+            return _index_response(request, _INDEX)
         
         logger.error("Frontend index.html not found")
         raise HTTPException(status_code=404, detail="Frontend not found")
@@ -907,7 +1264,7 @@ else:
         if full_path.startswith("api/") or full_path.startswith("api"):
             raise HTTPException(status_code=404, detail="API endpoint not found")
         
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=503,
             content={
                 "detail": "Frontend not deployed",
@@ -917,9 +1274,8 @@ else:
         )
 
 # --- 13. LOG ALL ROUTES ON STARTUP ---
-@app.on_event("startup")
-async def log_routes():
-    """Log all registered routes for debugging"""
+def _log_routes(app: FastAPI):
+    """Log all registered routes for debugging (called from lifespan)"""
     logger.info("=" * 80)
     logger.info("REGISTERED ROUTES:")
     logger.info("=" * 80)
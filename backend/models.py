@@ -1,7 +1,13 @@
 from pydantic import BaseModel, Field
 from datetime import datetime
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Literal
 from enum import Enum
+import uuid
+
+
+# Random 128-bit IDs: unique across workers/processes and not guessable from a neighbour's ID
+def _new_id() -> str:
+    return uuid.uuid4().hex
 
 
 class DataSource(str, Enum):
@@ -22,8 +28,15 @@ class PolicyCategory(str, Enum):
     TECHNOLOGY = "technology"
 
 
+# Field type for categories: pydantic-core validates a Literal with a set lookup instead of an
+# enum lookup and stores the plain string. PolicyCategory members are still accepted as input.
+PolicyCategoryValue = Literal[
+    "economic", "social", "environmental", "healthcare", "education", "security", "technology"
+]
+
+
 class ScrapedData(BaseModel):
-    id: str = Field(default_factory=lambda: str(datetime.utcnow().timestamp()))
+    id: str = Field(default_factory=_new_id)
     source: DataSource
     url: str
     title: str
@@ -31,7 +44,7 @@ class ScrapedData(BaseModel):
     metadata: Dict[str, Any] = {}
     scraped_at: datetime = Field(default_factory=datetime.utcnow)
     processed: bool = False
-    category: Optional[PolicyCategory] = None
+    category: Optional[PolicyCategoryValue] = None
     tags: List[str] = []
     relevance_score: Optional[float] = None
 
@@ -46,20 +59,20 @@ class VisualizationConfig(BaseModel):
 
 
 class PolicyInsight(BaseModel):
-    id: str = Field(default_factory=lambda: str(datetime.utcnow().timestamp()))
+    id: str = Field(default_factory=_new_id)
     text: str
     confidence_score: float = 0.0
     supporting_data_ids: List[str] = []
-    category: PolicyCategory
+    category: PolicyCategoryValue
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
 
 class PolicyRecommendation(BaseModel):
-    id: str = Field(default_factory=lambda: str(datetime.utcnow().timestamp()))
+    id: str = Field(default_factory=_new_id)
     title: str
     description: str
     priority: str  # 'high', 'medium', 'low'
-    category: PolicyCategory
+    category: PolicyCategoryValue
     impact: str
     implementation_steps: List[str]
     supporting_insights: List[str] = []
@@ -68,7 +81,7 @@ class PolicyRecommendation(BaseModel):
 
 
 class ChatMessage(BaseModel):
-    id: str = Field(default_factory=lambda: str(datetime.utcnow().timestamp()))
+    id: str = Field(default_factory=_new_id)
     session_id: str
     sender: str  # 'user' or 'ai'
     content: str
@@ -79,7 +92,7 @@ class ChatMessage(BaseModel):
 
 
 class ChatSession(BaseModel):
-    id: str = Field(default_factory=lambda: str(datetime.utcnow().timestamp()))
+    id: str = Field(default_factory=_new_id)
     user_id: Optional[str] = None  # NEW: Link session to user (None for legacy/anonymous)
     title: str = "Policy Analysis Session"
     messages: List[ChatMessage] = []
@@ -105,7 +118,7 @@ class PolicyAnalysisResponse(BaseModel):
     supporting_data_count: int = 0
     
 class SensusData(BaseModel):
-    id: str = Field(default_factory=lambda: str(datetime.utcnow().timestamp()))
+    id: str = Field(default_factory=_new_id)
     provinsi: str
     kode_provinsi: str
     tahun: int
@@ -118,4 +131,15 @@ class QueryIntent(BaseModel):
     intent_type: str  # 'comparison', 'ranking', 'trend', 'distribution'
     provinces: List[str] = []
     sectors: List[str] = []  # Kode KBLI
-    aggregation: str = 'sum'  # 'sum', 'average', 'count'
\ No newline at end of file
+    aggregation: str = 'sum'  # 'sum', 'average', 'count'
+
+# Materialize pydantic-core validators/serializers at import time so the
+# first request doesn't pay for schema building
+for _model in (
+    ScrapedData, VisualizationConfig, PolicyInsight, PolicyRecommendation, ChatMessage,
+    ChatSession, PolicyAnalysisRequest, PolicyAnalysisResponse, SensusData, QueryIntent
+):
+    _model.model_rebuild()
+    _model.__pydantic_validator__
+    _model.__pydantic_serializer__
+del _model
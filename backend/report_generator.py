@@ -1,109 +1,718 @@
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch, cm
-from reportlab.lib.colors import HexColor, black, white
-from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_JUSTIFY
-from reportlab.platypus import (
-    SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, 
-    PageBreak, ListFlowable, ListItem, KeepTogether
-)
-from reportlab.lib import colors
-from docx import Document
-from docx.shared import Inches, Pt, RGBColor, Cm
-from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
-from docx.enum.table import WD_TABLE_ALIGNMENT
-from docx.enum.style import WD_STYLE_TYPE
-from docx.oxml.ns import qn
-from docx.oxml import OxmlElement
 from io import BytesIO
+from collections import OrderedDict
 from datetime import datetime
+from tempfile import SpooledTemporaryFile
+from types import SimpleNamespace
+from xml.sax.saxutils import escape as _xml_escape
+from typing import BinaryIO, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, TypeVar, Union, cast
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import functools
+import itertools
+import operator
+import os
+import re
+import threading
+import weakref
 import logging
 import json
 
+import numpy as np
+from jinja2 import BaseLoader, Environment
+from markupsafe import Markup
+
 logger = logging.getLogger(__name__)
 
+# Escape reportlab markup characters and convert newlines in a single pass
+_BR_TABLE = str.maketrans({'\n': '<br/>', '&': '&amp;', '<': '&lt;', '>': '&gt;'})
+# Markdown **bold** spans; the escape table above leaves '*' untouched
+_BOLD_RE = re.compile(r'\*\*(.+?)\*\*', re.DOTALL)
+
+
+def _safe_para(text) -> str:
+    """Escape user text for a ReportLab Paragraph, keeping only our own <br/> and <b> markup"""
+    return _BOLD_RE.sub(r'<b>\1</b>', str(text).translate(_BR_TABLE))
+
+
+# Same replacements as html.escape(quote=True), done in one str.translate pass
+_HTML_ESCAPE_MAP = {'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#x27;'}
+_HTML_ESCAPE = str.maketrans(_HTML_ESCAPE_MAP)
+# Message bodies also turn newlines into <br> within the same pass
+_HTML_ESCAPE_BR = str.maketrans({**_HTML_ESCAPE_MAP, '\n': '<br>'})
+
+
+def _esc(text: object) -> str:
+    """Escape user/model text for the HTML report"""
+    return str(text).translate(_HTML_ESCAPE)
+
+
+# Report rendering is CPU-bound; a dedicated pool caps it independently of the default executor
+_REPORT_POOL_WORKERS = int(os.environ.get('REPORT_POOL_WORKERS', '4'))
+_REPORT_POOL = ThreadPoolExecutor(max_workers=_REPORT_POOL_WORKERS, thread_name_prefix='report')
+
+# Async renders go to a spooled file: small reports stay in RAM, large ones spill to disk
+_SPOOL_MAX_SIZE = 1 << 20
+_STREAM_CHUNK_SIZE = 64 * 1024
+
+# Chart summaries kept per generator, keyed by config identity
+_SUMMARY_CACHE_SIZE = 128
+
+
+def iter_report_chunks(fileobj: BinaryIO, chunk_size: int = _STREAM_CHUNK_SIZE) -> Iterator[bytes]:
+    """Yield a rendered report in fixed-size chunks for StreamingResponse, closing it at the end"""
+    try:
+        while True:
+            chunk = fileobj.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        fileobj.close()
+
+
+# Rendered PDF/DOCX bytes kept in memory per (session id, updated_at, message count, format)
+_RENDERED_CACHE_SIZE = int(os.environ.get('REPORT_LRU_SIZE', '128'))
+# Larger renders are streamed from their spool file only, never copied into the LRU
+_RENDERED_CACHE_MAX_BYTES = int(os.environ.get('REPORT_LRU_MAX_BYTES', str(_SPOOL_MAX_SIZE)))
+
+
+# reportlab and python-docx are heavy; they are imported on the first report, not at startup
+_PDF_DEPS: Optional[SimpleNamespace] = None
+_DOCX_DEPS: Optional[SimpleNamespace] = None
+
+
+def _get_pdf_deps() -> SimpleNamespace:
+    global _PDF_DEPS
+    if _PDF_DEPS is None:
+        from reportlab.lib import colors
+        from reportlab.lib.colors import HexColor, white
+        from reportlab.lib.enums import TA_CENTER, TA_JUSTIFY
+        from reportlab.lib.pagesizes import A4
+        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+        from reportlab.lib.units import inch
+        from reportlab.platypus import (
+            SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, PageBreak
+        )
+        _PDF_DEPS = SimpleNamespace(
+            colors=colors, HexColor=HexColor, white=white,
+            TA_CENTER=TA_CENTER, TA_JUSTIFY=TA_JUSTIFY, A4=A4, inch=inch,
+            getSampleStyleSheet=getSampleStyleSheet, ParagraphStyle=ParagraphStyle,
+            SimpleDocTemplate=SimpleDocTemplate, Paragraph=Paragraph, Spacer=Spacer,
+            Table=Table, TableStyle=TableStyle, PageBreak=PageBreak
+        )
+    return _PDF_DEPS
+
+
+def _get_docx_deps() -> SimpleNamespace:
+    global _DOCX_DEPS
+    if _DOCX_DEPS is None:
+        from docx import Document
+        from docx.shared import Inches, Pt, RGBColor, Cm
+        from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
+        from docx.oxml import parse_xml
+        _DOCX_DEPS = SimpleNamespace(
+            Document=Document, Inches=Inches, Pt=Pt, RGBColor=RGBColor, Cm=Cm,
+            WD_PARAGRAPH_ALIGNMENT=WD_PARAGRAPH_ALIGNMENT, parse_xml=parse_xml
+        )
+    return _DOCX_DEPS
+
+
+def _format_value(value) -> str:
+    """Thousands-separated integer for numbers, plain text otherwise"""
+    if isinstance(value, (int, float)):
+        return f"{int(value):,}"
+    return str(value)
+
+
+def _numeric_total(values: list) -> float:
+    """Sum of the numeric chart values, ignoring labels such as 'N/A'"""
+    numeric = [value for value in values if isinstance(value, (int, float))]
+    if not numeric:
+        return 0
+    return float(np.fromiter(numeric, dtype=np.float64, count=len(numeric)).sum())
+
+
+# Raw WordprocessingML for DOCX tables; filling one string avoids python-docx's per-cell object API
+_W_NS = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+_DOCX_TABLE = (
+    '<w:tbl xmlns:w="{ns}"><w:tblPr><w:tblStyle w:val="TableGrid"/><w:tblW w:type="auto" w:w="0"/>{jc}'
+    '<w:tblLook w:val="04A0" w:firstRow="1" w:lastRow="0" w:firstColumn="1" w:lastColumn="0" '
+    'w:noHBand="0" w:noVBand="1"/></w:tblPr><w:tblGrid>{grid}</w:tblGrid>{rows}</w:tbl>'
+)
+_DOCX_CELL = (
+    '<w:tc><w:tcPr><w:tcW w:type="dxa" w:w="{width}"/>{shading}</w:tcPr>'
+    '<w:p><w:r>{run_props}<w:t xml:space="preserve">{text}</w:t></w:r></w:p></w:tc>'
+)
+
+_DOCX_LIST = '<w:body xmlns:w="{ns}">{items}</w:body>'
+_DOCX_LIST_ITEM = (
+    '<w:p><w:pPr><w:pStyle w:val="ListNumber"/><w:numPr><w:ilvl w:val="0"/><w:numId w:val="{num_id}"/>'
+    '</w:numPr>{indent}</w:pPr><w:r><w:t xml:space="preserve">{text}</w:t></w:r></w:p>'
+)
+
+
+# Static HTML report skeleton (CSS included); the $ slots are filled per report
+_HTML_REPORT_SKELETON = """<!DOCTYPE html>
+<html lang="id">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>Laporan Analisis Sensus Ekonomi</title>
+    $chart_loader
+    <style>
+        * { margin: 0; padding: 0; box-sizing: border-box; }
+        body { font-family: 'Segoe UI', Tahoma, sans-serif; line-height: 1.6; color: #2c3e50; background: #f8f9fa; }
+        .container { max-width: 1000px; margin: 0 auto; padding: 20px; }
+        .header { background: linear-gradient(135deg, #e74c3c, #c0392b); color: white; padding: 30px; text-align: center; border-radius: 10px; margin-bottom: 20px; }
+        .header h1 { font-size: 1.8rem; margin-bottom: 10px; }
+        .meta { font-size: 0.9rem; opacity: 0.9; }
+        .section { background: white; padding: 25px; border-radius: 10px; margin-bottom: 20px; box-shadow: 0 2px 10px rgba(0,0,0,0.05); }
+        .section h2 { color: #e74c3c; margin-bottom: 15px; font-size: 1.3rem; }
+        .message { padding: 15px; margin-bottom: 15px; border-radius: 8px; }
+        .message.user { background: #e8f4f8; border-left: 4px solid #3498db; }
+        .message.ai { background: #fef5e7; border-left: 4px solid #f39c12; }
+        .sender { font-weight: bold; margin-bottom: 8px; }
+        .chart-container { margin-bottom: 25px; padding: 15px; border: 1px solid #eee; border-radius: 8px; }
+        .chart-container h3 { color: #2c3e50; margin-bottom: 10px; font-size: 1rem; }
+        .chart { width: 100%; height: 350px; }
+        .insights-list { list-style: none; }
+        .insights-list li { padding: 10px 15px; margin-bottom: 8px; background: #e8f6f3; border-left: 4px solid #1abc9c; border-radius: 4px; }
+        .policy-card { padding: 20px; margin-bottom: 15px; border-radius: 8px; background: #fafafa; }
+        .policy-card.priority-high { border-left: 4px solid #e74c3c; }
+        .policy-card.priority-medium { border-left: 4px solid #f39c12; }
+        .policy-card.priority-low { border-left: 4px solid #2ecc71; }
+        .policy-header { display: flex; justify-content: space-between; align-items: center; margin-bottom: 10px; }
+        .policy-header h3 { font-size: 1.1rem; color: #2c3e50; }
+        .priority-badge { font-size: 0.85rem; }
+        .description { margin-bottom: 10px; }
+        .meta { font-size: 0.9rem; color: #666; margin-bottom: 10px; }
+        .steps { background: white; padding: 10px 15px; border-radius: 5px; margin-top: 10px; }
+        .steps ol { margin-left: 20px; margin-top: 8px; }
+        .footer { text-align: center; padding: 20px; color: #666; font-size: 0.85rem; }
+        @media print { .chart { page-break-inside: avoid; } }
+    </style>
+</head>
+<body>
+    <div class="container">
+        <div class="header">
+            <h1>📊 Laporan Analisis Sensus Ekonomi Indonesia</h1>
+            <p class="meta">Tanggal: $date_str | Topik: $title</p>
+        </div>
+        
+        <section class="section">
+            <h2>📝 Ringkasan Analisis</h2>
+            $messages_html
+        </section>
+        
+        $viz_html
+        $insights_html
+        $policies_html
+        
+        <div class="footer">
+            <p>Laporan ini dihasilkan secara otomatis oleh Sistem Analisis Sensus Ekonomi Indonesia.<br>
+            Data bersumber dari Sensus Ekonomi 2016, BPS. © $year</p>
+        </div>
+    </div>
+    $chart_scripts
+</body>
+</html>"""
+# ECharts is only loaded and wired up when the report has charts
+_HTML_CHART_LOADER = '<script src="https://cdn.jsdelivr.net/npm/echarts@5.4.3/dist/echarts.min.js"></script>'
+# Resize is debounced so dragging the window re-lays out the charts once, not on every event
+_HTML_CHART_RESIZE = """
+        var resizeTimer;
+        window.addEventListener('resize', function() {
+            clearTimeout(resizeTimer);
+            resizeTimer = setTimeout(function() {
+                document.querySelectorAll('.chart').forEach(function(el) {
+                    var chart = echarts.getInstanceByDom(el);
+                    if (chart) chart.resize();
+                });
+            }, 100);
+        });
+    </script>"""
+# Pre-split once into static markup and the slot names between them so reports can stream slot by slot
+_HTML_REPORT_PARTS: List[str] = re.split(r'\$(\w+)', _HTML_REPORT_SKELETON)
+_HTML_REPORT_STATIC: List[str] = _HTML_REPORT_PARTS[0::2]
+_HTML_REPORT_SLOTS: List[str] = _HTML_REPORT_PARTS[1::2]
+# Static markup (CSS, echarts loader, footer) encoded once for the byte stream
+_HTML_REPORT_STATIC_BYTES: List[bytes] = [part.encode('utf-8') for part in _HTML_REPORT_STATIC]
+# Static fragments are either all str or all bytes; slot content is always str
+_Static = TypeVar('_Static', str, bytes)
+# HTML fragments are coalesced into chunks of about this many characters before being sent
+_HTML_CHUNK_CHARS = 16 * 1024
+
+
+# Sender -> (CSS class, label); anything that is not 'user' renders as the assistant
+_SENDER_LABELS = {
+    'user': ('user', '👤 Pengguna'),
+    'ai': ('ai', '🤖 AI Asisten')
+}
+_AI_SENDER = _SENDER_LABELS['ai']
+# Same labels without emoji for the PDF (Helvetica has no emoji glyphs)
+_PDF_SENDER_LABELS = {'user': 'Pengguna', 'ai': 'AI Asisten'}
+
+
+# Policy cards are rendered by one compiled template; autoescape keeps model text out of the markup
+_HTML_PRIORITY_BADGES = {
+    'high': '🔴 Prioritas Tinggi',
+    'medium': '🟡 Prioritas Menengah',
+    'low': '🟢 Prioritas Rendah'
+}
+# Markup % escapes each step, so the prebuilt <li> list stays safe under autoescape
+_STEP_ITEM = Markup('<li>%s</li>')
+_POLICY_ENV = Environment(loader=BaseLoader(), autoescape=True)
+_POLICY_TMPL = _POLICY_ENV.from_string("""<section class='section'><h2>🎯 Rekomendasi Kebijakan</h2>
+{%- for priority, title, description, category, impact, steps in policies %}
+                    <div class='policy-card priority-{{ priority }}'>
+                        <div class='policy-header'>
+                            <h3>{{ loop.index }}. {{ title }}</h3>
+                            <span class='priority-badge'>{{ badges.get(priority, '🟡') }}</span>
+                        </div>
+                        <p class='description'>{{ description }}</p>
+                        <p class='meta'><strong>Kategori:</strong> {{ category }} | <strong>Dampak:</strong> {{ impact }}</p>
+                        {% if steps -%}
+                        <div class='steps'><strong>Langkah Implementasi:</strong><ol>{{ steps }}</ol></div>
+                        {%- endif %}
+                    </div>
+{%- endfor %}</section>""")
+
+
+# Only what the reports read is dumped from a ChatSession
+_SESSION_DUMP_FIELDS = {
+    'title': True,
+    'messages': {'__all__': {'sender', 'content', 'timestamp', 'visualizations', 'insights', 'policies'}}
+}
+
+def _policy_fields(policy: dict) -> Tuple[str, str, str, str, str, Markup]:
+    """Read a policy dict once into (priority, title, description, category, impact, steps)"""
+    get = policy.get
+    return (
+        get('priority', 'medium'),
+        get('title', 'Rekomendasi'),
+        get('description', ''),
+        get('category', '-'),
+        get('impact', '-'),
+        Markup('').join([_STEP_ITEM % step for step in get('implementation_steps') or ()])
+    )
+
+
+def _coalesce(parts: Iterable[str], size: int = _HTML_CHUNK_CHARS) -> Iterator[str]:
+    """Group many small string fragments into chunks of roughly size characters"""
+    buffer: List[str] = []
+    buffered = 0
+    for part in parts:
+        buffer.append(part)
+        buffered += len(part)
+        if buffered >= size:
+            yield ''.join(buffer)
+            buffer.clear()
+            buffered = 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+def _coalesce_bytes(parts: Iterable[Union[str, bytes]], size: int = _HTML_CHUNK_CHARS) -> Iterator[bytes]:
+    """Like _coalesce but emits UTF-8 chunks; pre-encoded bytes fragments are copied in as-is"""
+    out = bytearray()
+    text: List[str] = []
+    buffered = 0
+    for part in parts:
+        if isinstance(part, bytes):
+            if text:
+                out += ''.join(text).encode('utf-8')
+                text.clear()
+            out += part
+        else:
+            text.append(part)
+        buffered += len(part)
+        if buffered >= size:
+            if text:
+                out += ''.join(text).encode('utf-8')
+                text.clear()
+            yield bytes(out)
+            out.clear()
+            buffered = 0
+    if text:
+        out += ''.join(text).encode('utf-8')
+    if out:
+        yield bytes(out)
+
+
+# Field readers for _extract_session_data; attrgetter does the lookups in C
+_MSG_FIELDS = operator.attrgetter('sender', 'content', 'timestamp')
+_VIZ_FIELDS = operator.attrgetter('title', 'type', 'config', 'data')
+
+
+def _dispatch(handlers: dict, resolve: Callable, obj):
+    """Convert obj with the handler registered for its type, resolving it on first sight"""
+    handler = handlers.get(type(obj))
+    if handler is None:
+        handler = handlers[type(obj)] = resolve(obj)
+    return handler(obj)
+
+
+def _skip(obj):
+    return None
+
+
+def _identity(obj):
+    return obj
+
+
+def _model_dict(obj):
+    return obj.model_dump() if hasattr(obj, 'model_dump') else obj.dict()
+
+
+def _viz_from_attrs(viz) -> dict:
+    try:
+        title, viz_type, config, data = _VIZ_FIELDS(viz)
+    except AttributeError:
+        title = getattr(viz, 'title', '')
+        viz_type = getattr(viz, 'type', 'chart')
+        config = getattr(viz, 'config', {})
+        data = getattr(viz, 'data', {})
+    return {'title': title, 'type': viz_type, 'config': config, 'data': data}
+
+
+def _policy_from_attrs(policy) -> dict:
+    return {
+        'title': getattr(policy, 'title', ''),
+        'description': getattr(policy, 'description', ''),
+        'priority': getattr(policy, 'priority', 'medium'),
+        'category': str(getattr(policy, 'category', 'economic')),
+        'impact': getattr(policy, 'impact', ''),
+        'implementation_steps': getattr(policy, 'implementation_steps', [])
+    }
+
+
+def _insight_from_dict(insight: dict) -> str:
+    return insight.get('text', insight.get('description', str(insight)))
+
+
+def _resolve_viz(viz) -> Callable:
+    if isinstance(viz, dict):
+        return _identity
+    if hasattr(viz, 'dict'):
+        return _model_dict
+    if hasattr(viz, 'title'):
+        return _viz_from_attrs
+    return _skip
+
+
+def _resolve_policy(policy) -> Callable:
+    if isinstance(policy, dict):
+        return _identity
+    if hasattr(policy, 'dict'):
+        return _model_dict
+    if hasattr(policy, 'title'):
+        return _policy_from_attrs
+    return _skip
+
+
+def _resolve_insight(insight) -> Callable:
+    if isinstance(insight, str):
+        return _identity
+    if isinstance(insight, dict):
+        return _insight_from_dict
+    return _skip
+
+
+# Type -> converter tables, filled lazily by _dispatch
+_VIZ_HANDLERS: dict = {dict: _identity}
+_POLICY_HANDLERS: dict = {dict: _identity}
+_INSIGHT_HANDLERS: dict = {str: _identity, dict: _insight_from_dict}
+
 
 class ReportGenerator:
     """Generate PDF and Word reports from chat session analysis data with visualizations and policies"""
     
+    # The PDF uses the standard Helvetica fonts, which have no emoji glyphs: text badges instead
+    _PRIORITY_PDF = {
+        'high': '[Tinggi]',
+        'medium': '[Menengah]',
+        'low': '[Rendah]'
+    }
+    _PRIORITY_DOCX = {
+        'high': '🔴 Prioritas Tinggi',
+        'medium': '🟡 Prioritas Menengah',
+        'low': '🟢 Prioritas Rendah'
+    }
+    
     def __init__(self):
-        self.primary_color = HexColor('#e74c3c')
-        self.secondary_color = HexColor('#3498db')
-        self.success_color = HexColor('#2ecc71')
-        self.warning_color = HexColor('#f39c12')
-        self.text_color = HexColor('#2c3e50')
-        self.light_bg = HexColor('#f8f9fa')
+        # reportlab/python-docx are imported on first use; PDF styles are built once
+        self._pdf_styles = None
+        self._styles_lock = threading.Lock()
+        # Keyed by (title, date_str, year); the date has minute resolution so cached PDFs never go stale
+        self._render_empty_pdf = functools.lru_cache(maxsize=8)(self._render_empty_pdf_uncached)
+        # Flowables hold drawing state (canv) while a doc builds, so the cached header is per thread
+        self._local = threading.local()
+        # id(session) -> (weakref to session, message count, extracted data); entries die with the session
+        self._extract_cache: Dict[int, Tuple[weakref.ref, int, dict]] = {}
+        # id(config) -> (config, (labels, values)), bounded LRU
+        self._summary_cache: "OrderedDict[int, Tuple[dict, Tuple[List[str], list]]]" = OrderedDict()
+        self._summary_lock = threading.Lock()
+        # (session id, updated_at, message count, fmt, date_str) -> rendered bytes, bounded LRU
+        self._rendered_cache: "OrderedDict[tuple, bytes]" = OrderedDict()
+        self._rendered_lock = threading.Lock()
+        # Compact, reusable encoder for ECharts configs; configs come from JSON so they cannot be circular
+        self._encoder = json.JSONEncoder(
+            ensure_ascii=False, separators=(',', ':'), check_circular=False, default=str
+        )
+    
+    def _get_pdf_styles(self):
+        """Build (once) the colors and ParagraphStyles used by generate_pdf"""
+        if self._pdf_styles is not None:
+            return self._pdf_styles
+        with self._styles_lock:
+            if self._pdf_styles is None:
+                self._pdf_styles = self._build_pdf_styles()
+        return self._pdf_styles
+    
+    def _build_pdf_styles(self):
+        """Create the stylesheet with every custom style, including the footer, plus the table styles"""
+        rl = _get_pdf_deps()
+        
+        self.primary_color = rl.HexColor('#e74c3c')
+        self.secondary_color = rl.HexColor('#3498db')
+        self.success_color = rl.HexColor('#2ecc71')
+        self.warning_color = rl.HexColor('#f39c12')
+        self.text_color = rl.HexColor('#2c3e50')
+        self.light_bg = rl.HexColor('#f8f9fa')
+        
+        styles = rl.getSampleStyleSheet()
+        
+        # Custom styles
+        styles.add(rl.ParagraphStyle(
+            name='CustomTitle',
+            parent=styles['Heading1'],
+            fontSize=24,
+            spaceAfter=20,
+            spaceBefore=10,
+            alignment=rl.TA_CENTER,
+            textColor=self.primary_color
+        ))
+        
+        styles.add(rl.ParagraphStyle(
+            name='SectionTitle',
+            parent=styles['Heading2'],
+            fontSize=14,
+            spaceAfter=10,
+            spaceBefore=15,
+            textColor=self.primary_color,
+            borderPadding=(5, 5, 5, 5)
+        ))
+        
+        styles.add(rl.ParagraphStyle(
+            name='SubSection',
+            parent=styles['Heading3'],
+            fontSize=12,
+            spaceAfter=8,
+            spaceBefore=10,
+            textColor=self.secondary_color
+        ))
+        
+        styles.add(rl.ParagraphStyle(
+            name='BodyTextCustom',
+            parent=styles['BodyText'],
+            fontSize=10,
+            spaceAfter=8,
+            alignment=rl.TA_JUSTIFY,
+            leading=14
+        ))
+        
+        styles.add(rl.ParagraphStyle(
+            name='InsightText',
+            parent=styles['BodyText'],
+            fontSize=10,
+            spaceAfter=6,
+            leftIndent=20,
+            bulletIndent=10
+        ))
+        
+        styles.add(rl.ParagraphStyle(
+            name='PolicyTitle',
+            parent=styles['Heading4'],
+            fontSize=11,
+            spaceAfter=4,
+            spaceBefore=8,
+            textColor=self.text_color
+        ))
+        
+        styles.add(rl.ParagraphStyle(
+            name='Footer',
+            parent=styles['BodyText'],
+            fontSize=8,
+            alignment=rl.TA_CENTER,
+            textColor=rl.colors.grey
+        ))
+        
+        # Table styles are only read by setStyle, so one instance serves every table
+        self._meta_table_style = rl.TableStyle([
+            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 10),
+            ('TEXTCOLOR', (0, 0), (0, -1), self.text_color),
+            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 5),
+        ])
+        self._viz_table_style = rl.TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), self.primary_color),
+            ('TEXTCOLOR', (0, 0), (-1, 0), rl.white),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 9),
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('ALIGN', (2, 0), (2, -1), 'RIGHT'),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('GRID', (0, 0), (-1, -1), 0.5, rl.colors.grey),
+            ('ROWBACKGROUNDS', (0, 1), (-1, -2), [rl.white, self.light_bg]),
+            ('BACKGROUND', (0, -1), (-1, -1), rl.HexColor('#ecf0f1')),
+            ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+            ('TOPPADDING', (0, 0), (-1, -1), 6),
+        ])
+        
+        return styles
+    
+    def _get_pdf_header(self) -> list:
+        """Static title flowables shared by every PDF built on this thread"""
+        header = getattr(self._local, 'pdf_header', None)
+        if header is None:
+            rl = _get_pdf_deps()
+            
+            styles = self._get_pdf_styles()
+            header = self._local.pdf_header = [
+                rl.Paragraph("Laporan Analisis Sensus Ekonomi Indonesia", styles['CustomTitle']),
+                rl.Spacer(1, 0.2*rl.inch)
+            ]
+        return header
     
     def _extract_session_data(self, session) -> dict:
+        """Extract session data once per session object, so PDF/DOCX/HTML of one session share it"""
+        key = id(session)
+        message_count = len(getattr(session, 'messages', None) or ())
+        cached = self._extract_cache.get(key)
+        # id() is only unique while the object lives, hence the weakref identity check
+        if cached is not None and cached[0]() is session and cached[1] == message_count:
+            return cached[2]
+        
+        data = self._extract_session_data_uncached(session)
+        try:
+            ref = weakref.ref(session, functools.partial(self._forget_extracted, key))
+        except TypeError:
+            return data
+        self._extract_cache[key] = (ref, message_count, data)
+        return data
+    
+    def _forget_extracted(self, key: int, _ref: weakref.ref) -> None:
+        self._extract_cache.pop(key, None)
+    
+    def _extract_session_data_uncached(self, session) -> dict:
         """Extract all relevant data from session for report"""
-        data = {
+        if hasattr(session, 'model_dump'):
+            return self._extract_dumped_session(session.model_dump(include=_SESSION_DUMP_FIELDS))
+        
+        data: dict = {
             'title': getattr(session, 'title', 'Analisis Sensus Ekonomi'),
             'messages': [],
             'visualizations': [],
             'insights': [],
             'policies': []
         }
+        visualizations = data['visualizations']
+        insights = data['insights']
+        policies = data['policies']
         
         messages = getattr(session, 'messages', [])
         for msg in messages:
-            msg_data = {
-                'sender': getattr(msg, 'sender', 'user'),
-                'content': getattr(msg, 'content', ''),
-                'timestamp': getattr(msg, 'timestamp', None)
-            }
+            try:
+                sender, content, timestamp = _MSG_FIELDS(msg)
+            except AttributeError:
+                sender = getattr(msg, 'sender', 'user')
+                content = getattr(msg, 'content', '')
+                timestamp = getattr(msg, 'timestamp', None)
             
-            # Extract visualizations from AI messages
-            if msg_data['sender'] == 'ai':
-                viz_list = getattr(msg, 'visualizations', [])
-                if viz_list:
-                    for viz in viz_list:
-                        if isinstance(viz, dict):
-                            data['visualizations'].append(viz)
-                        elif hasattr(viz, 'dict'):
-                            data['visualizations'].append(viz.dict())
-                        elif hasattr(viz, 'title'):
-                            data['visualizations'].append({
-                                'title': getattr(viz, 'title', ''),
-                                'type': getattr(viz, 'type', 'chart'),
-                                'config': getattr(viz, 'config', {}),
-                                'data': getattr(viz, 'data', {})
-                            })
+            # Extract visualizations, insights and policies from AI messages
+            if sender == 'ai':
+                for viz in getattr(msg, 'visualizations', None) or ():
+                    item = _dispatch(_VIZ_HANDLERS, _resolve_viz, viz)
+                    if item is not None:
+                        visualizations.append(item)
                 
-                # Extract insights
-                insights_list = getattr(msg, 'insights', [])
-                if insights_list:
-                    for insight in insights_list:
-                        if isinstance(insight, str):
-                            data['insights'].append(insight)
-                        elif isinstance(insight, dict):
-                            data['insights'].append(insight.get('text', insight.get('description', str(insight))))
+                for insight in getattr(msg, 'insights', None) or ():
+                    item = _dispatch(_INSIGHT_HANDLERS, _resolve_insight, insight)
+                    if item is not None:
+                        insights.append(item)
                 
-                # Extract policies
-                policies_list = getattr(msg, 'policies', [])
-                if policies_list:
-                    for policy in policies_list:
-                        if isinstance(policy, dict):
-                            data['policies'].append(policy)
-                        elif hasattr(policy, 'dict'):
-                            data['policies'].append(policy.dict())
-                        elif hasattr(policy, 'title'):
-                            data['policies'].append({
-                                'title': getattr(policy, 'title', ''),
-                                'description': getattr(policy, 'description', ''),
-                                'priority': getattr(policy, 'priority', 'medium'),
-                                'category': str(getattr(policy, 'category', 'economic')),
-                                'impact': getattr(policy, 'impact', ''),
-                                'implementation_steps': getattr(policy, 'implementation_steps', [])
-                            })
+                for policy in getattr(msg, 'policies', None) or ():
+                    item = _dispatch(_POLICY_HANDLERS, _resolve_policy, policy)
+                    if item is not None:
+                        policies.append(item)
             
-            data['messages'].append(msg_data)
+            data['messages'].append({
+                'sender': sender,
+                'content': content,
+                'timestamp': timestamp
+            })
+        
+        return data
+    
+    @staticmethod
+    def _extract_dumped_session(dumped: dict) -> dict:
+        """Fast path for ChatSession models: one model_dump, then plain dict access"""
+        data = {
+            'title': dumped.get('title', 'Analisis Sensus Ekonomi'),
+            'messages': [],
+            'visualizations': [],
+            'insights': [],
+            'policies': []
+        }
+        
+        for msg in dumped.get('messages') or ():
+            sender = msg.get('sender', 'user')
+            if sender == 'ai':
+                data['visualizations'].extend(msg.get('visualizations') or ())
+                data['insights'].extend(msg.get('insights') or ())
+                data['policies'].extend(msg.get('policies') or ())
+            data['messages'].append({
+                'sender': sender,
+                'content': msg.get('content', ''),
+                'timestamp': msg.get('timestamp')
+            })
         
         return data
     
-    def _extract_chart_data_summary(self, viz: dict) -> list:
-        """Extract data summary from visualization config for table display"""
+    @staticmethod
+    def _build_meta_rows(session_data: dict, date_str: str) -> List[Tuple[str, str]]:
+        """Metadata rows shared by the PDF and DOCX reports; the date is per render, so not cached"""
+        return [
+            ('Tanggal Pembuatan', date_str),
+            ('Topik Analisis', session_data['title']),
+            ('Jumlah Visualisasi', str(len(session_data['visualizations']))),
+            ('Jumlah Rekomendasi', str(len(session_data['policies'])))
+        ]
+    
+    def _extract_chart_data_summary(self, viz: dict) -> Tuple[List[str], list]:
+        """Chart summary memoized by config identity; PDF and DOCX of one session share the dicts"""
         config = viz.get('config', {})
-        data_summary = []
+        key = id(config)
+        with self._summary_lock:
+            cached = self._summary_cache.get(key)
+            # The entry holds config itself, so a matching id is always the same live object
+            if cached is not None and cached[0] is config:
+                self._summary_cache.move_to_end(key)
+                return cached[1]
+        
+        summary = self._summarize_chart_config(config)
+        with self._summary_lock:
+            self._summary_cache[key] = (config, summary)
+            if len(self._summary_cache) > _SUMMARY_CACHE_SIZE:
+                self._summary_cache.popitem(last=False)
+        return summary
+    
+    def _summarize_chart_config(self, config: dict) -> Tuple[List[str], list]:
+        """Extract (labels, values) from visualization config for table display"""
+        labels: List[str] = []
+        values: list = []
         
         try:
             # Try to get data from series
@@ -124,677 +733,644 @@ class ReportGenerator:
                 
                 # Build data summary
                 if categories and chart_data:
-                    for i, cat in enumerate(categories[:10]):  # Limit to 10 rows
-                        if i < len(chart_data):
-                            value = chart_data[i]
-                            if isinstance(value, dict):
-                                value = value.get('value', 0)
-                            data_summary.append({
-                                'label': str(cat),
-                                'value': value
-                            })
+                    count = min(len(categories), len(chart_data), 10)  # Limit to 10 rows
+                    labels = [str(cat) for cat in categories[:count]]
+                    values = [
+                        value.get('value', 0) if isinstance(value, dict) else value
+                        for value in chart_data[:count]
+                    ]
                 elif chart_data:
                     # Pie chart data format
-                    for item in chart_data[:10]:
-                        if isinstance(item, dict):
-                            data_summary.append({
-                                'label': item.get('name', ''),
-                                'value': item.get('value', 0)
-                            })
+                    items = [item for item in chart_data[:10] if isinstance(item, dict)]
+                    labels = [item.get('name', '') for item in items]
+                    values = [item.get('value', 0) for item in items]
         except Exception as e:
             logger.error(f"Error extracting chart data: {e}")
+            return [], []
         
-        return data_summary
+        return labels, values
     
-    def generate_pdf(self, session) -> BytesIO:
-        """Generate comprehensive PDF report with visualizations and policies"""
+    async def generate_pdf_async(self, session) -> BinaryIO:
+        """Render the PDF into a spooled file on the report thread pool"""
+        return await self._generate_cached_async('pdf', self.generate_pdf, session)
+    
+    async def generate_docx_async(self, session) -> BinaryIO:
+        """Render the DOCX into a spooled file on the report thread pool"""
+        return await self._generate_cached_async('docx', self.generate_docx, session)
+    
+    async def _generate_cached_async(self, fmt: str, render: Callable, session) -> BinaryIO:
+        """Serve a repeat download from the in-memory LRU, otherwise render on the pool and remember it"""
+        key = self._rendered_key(session, fmt)
+        if key is not None:
+            with self._rendered_lock:
+                cached = self._rendered_cache.get(key)
+                if cached is not None:
+                    self._rendered_cache.move_to_end(key)
+            if cached is not None:
+                return BytesIO(cached)
+        
+        loop = asyncio.get_running_loop()
+        output = SpooledTemporaryFile(max_size=_SPOOL_MAX_SIZE)
+        try:
+            buffer = await loop.run_in_executor(_REPORT_POOL, render, session, output)
+        except Exception:
+            output.close()
+            raise
+        
+        size = buffer.seek(0, os.SEEK_END)
+        buffer.seek(0)
+        if key is not None and size <= _RENDERED_CACHE_MAX_BYTES:
+            rendered = buffer.read()
+            buffer.seek(0)
+            with self._rendered_lock:
+                self._rendered_cache[key] = rendered
+                if len(self._rendered_cache) > _RENDERED_CACHE_SIZE:
+                    self._rendered_cache.popitem(last=False)
+        return buffer
+    
+    @staticmethod
+    def _rendered_key(session, fmt: str) -> Optional[tuple]:
+        """
+        Exact-match key for a stored session. The printed date is deliberately not part of it:
+        a repeat download of an unchanged session shows the date of its first render, and any
+        new message bumps updated_at, which renders (and dates) the report afresh.
+        """
+        session_id = getattr(session, 'id', None)
+        updated_at = getattr(session, 'updated_at', None)
+        if session_id is None or updated_at is None:
+            return None
+        return session_id, updated_at, len(getattr(session, 'messages', None) or ()), fmt
+    
+    async def generate_all(self, session) -> Tuple[BinaryIO, BinaryIO]:
+        """Render PDF and DOCX side by side on the report pool from one extraction pass"""
+        loop = asyncio.get_running_loop()
+        # Extraction walks every message and chart config; keep it off the event loop too
+        session_data = await loop.run_in_executor(_REPORT_POOL, self._extract_session_data, session)
+        # SpooledTemporaryFile is typed IO[bytes]; the builders accept any binary file object
+        pdf_output = cast(BinaryIO, SpooledTemporaryFile(max_size=_SPOOL_MAX_SIZE))
+        docx_output = cast(BinaryIO, SpooledTemporaryFile(max_size=_SPOOL_MAX_SIZE))
         try:
-            buffer = BytesIO()
-            doc = SimpleDocTemplate(
-                buffer, 
-                pagesize=A4,
-                rightMargin=50, 
-                leftMargin=50,
-                topMargin=50, 
-                bottomMargin=50
+            pdf, docx = await asyncio.gather(
+                loop.run_in_executor(_REPORT_POOL, self._build_pdf_from_data, session_data, pdf_output),
+                loop.run_in_executor(_REPORT_POOL, self._build_docx_from_data, session_data, docx_output)
             )
-            
-            elements = []
-            styles = getSampleStyleSheet()
-            
-            # Custom styles
-            styles.add(ParagraphStyle(
-                name='CustomTitle',
-                parent=styles['Heading1'],
-                fontSize=24,
-                spaceAfter=20,
-                spaceBefore=10,
-                alignment=TA_CENTER,
-                textColor=self.primary_color
-            ))
-            
-            styles.add(ParagraphStyle(
-                name='SectionTitle',
-                parent=styles['Heading2'],
-                fontSize=14,
-                spaceAfter=10,
-                spaceBefore=15,
-                textColor=self.primary_color,
-                borderPadding=(5, 5, 5, 5)
-            ))
-            
-            styles.add(ParagraphStyle(
-                name='SubSection',
-                parent=styles['Heading3'],
-                fontSize=12,
-                spaceAfter=8,
-                spaceBefore=10,
-                textColor=self.secondary_color
-            ))
-            
-            styles.add(ParagraphStyle(
-                name='BodyTextCustom',
-                parent=styles['BodyText'],
-                fontSize=10,
-                spaceAfter=8,
-                alignment=TA_JUSTIFY,
-                leading=14
-            ))
-            
-            styles.add(ParagraphStyle(
-                name='InsightText',
-                parent=styles['BodyText'],
-                fontSize=10,
-                spaceAfter=6,
-                leftIndent=20,
-                bulletIndent=10
-            ))
-            
-            styles.add(ParagraphStyle(
-                name='PolicyTitle',
-                parent=styles['Heading4'],
-                fontSize=11,
-                spaceAfter=4,
-                spaceBefore=8,
-                textColor=self.text_color
+            return pdf, docx
+        except Exception as e:
+            logger.error(f"Error generating reports: {e}", exc_info=True)
+            pdf_output.close()
+            docx_output.close()
+            raise
+    
+    def generate_pdf(self, session, output: Optional[BinaryIO] = None) -> BinaryIO:
+        """Generate comprehensive PDF report with visualizations and policies"""
+        try:
+            return self._build_pdf_from_data(self._extract_session_data(session), output)
+        except Exception as e:
+            logger.error(f"Error generating PDF: {e}", exc_info=True)
+            raise
+    
+    def _build_pdf_from_data(self, session_data: dict, output: Optional[BinaryIO] = None) -> BinaryIO:
+        """Render already-extracted session data as a PDF"""
+        buffer = output if output is not None else BytesIO()
+        now = datetime.now()
+        date_str = now.strftime("%d %B %Y, %H:%M WIB")
+        year = now.year
+        
+        if not session_data['messages']:
+            # Sessions downloaded before any analysis render to identical bytes
+            buffer.write(self._render_empty_pdf(session_data['title'], date_str, year))
+        else:
+            self._build_pdf(session_data, date_str, year, buffer)
+        
+        buffer.seek(0)
+        return buffer
+    
+    def _render_empty_pdf_uncached(self, title: str, date_str: str, year: int) -> bytes:
+        buffer = BytesIO()
+        self._build_pdf({
+            'title': title,
+            'messages': [],
+            'visualizations': [],
+            'insights': [],
+            'policies': []
+        }, date_str, year, buffer)
+        return buffer.getvalue()
+    
+    def _build_pdf(self, session_data: dict, date_str: str, year: int, buffer: BinaryIO):
+        """Render extracted session data as a PDF into buffer"""
+        rl = _get_pdf_deps()
+        
+        doc = rl.SimpleDocTemplate(
+            buffer, 
+            pagesize=rl.A4,
+            rightMargin=50, 
+            leftMargin=50,
+            topMargin=50, 
+            bottomMargin=50
+        )
+        
+        styles = self._get_pdf_styles()
+        # Each section builds its own flowable list; the document gets one combined list
+        elements = list(itertools.chain(
+            self._get_pdf_header(),
+            self._build_pdf_meta(session_data, date_str),
+            self._build_pdf_summary(session_data, styles),
+            self._build_pdf_viz(session_data, styles),
+            self._build_pdf_insights(session_data, styles),
+            self._build_pdf_policies(session_data, styles),
+            self._build_pdf_footer(year, styles),
+        ))
+        
+        doc.build(elements)
+    
+    def _build_pdf_meta(self, session_data: dict, date_str: str) -> list:
+        rl = _get_pdf_deps()
+        
+        meta_data = [(f"{label}:", value) for label, value in self._build_meta_rows(session_data, date_str)]
+        
+        meta_table = rl.Table(meta_data, colWidths=[150, 300])
+        meta_table.setStyle(self._meta_table_style)
+        return [meta_table, rl.Spacer(1, 0.3*rl.inch)]
+    
+    def _build_pdf_summary(self, session_data: dict, styles) -> list:
+        rl = _get_pdf_deps()
+        
+        elements = [
+            rl.Paragraph("Ringkasan Analisis", styles['SectionTitle']),
+            rl.Spacer(1, 0.1*rl.inch)
+        ]
+        
+        for msg in session_data['messages']:
+            sender = _PDF_SENDER_LABELS.get(msg['sender'], _PDF_SENDER_LABELS['ai'])
+        
+            # Clean and format content
+            content = _safe_para(msg['content'])
+        
+            # One Paragraph per message (sender header + body) keeps the flowable count low
+            elements.append(rl.Paragraph(
+                f'<font size="12" color="#3498db"><b>{sender}:</b></font><br/>{content}',
+                styles['BodyTextCustom']
             ))
-            
-            # Extract session data
-            session_data = self._extract_session_data(session)
-            
-            # === TITLE ===
-            title = Paragraph("📊 Laporan Analisis Sensus Ekonomi Indonesia", styles['CustomTitle'])
-            elements.append(title)
-            elements.append(Spacer(1, 0.2*inch))
-            
-            # === METADATA ===
-            date_str = datetime.now().strftime("%d %B %Y, %H:%M WIB")
-            meta_data = [
-                ['Tanggal Pembuatan:', date_str],
-                ['Topik Analisis:', session_data['title']],
-                ['Jumlah Visualisasi:', str(len(session_data['visualizations']))],
-                ['Jumlah Rekomendasi:', str(len(session_data['policies']))]
-            ]
-            
-            meta_table = Table(meta_data, colWidths=[150, 300])
-            meta_table.setStyle(TableStyle([
-                ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, -1), 10),
-                ('TEXTCOLOR', (0, 0), (0, -1), self.text_color),
-                ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-                ('BOTTOMPADDING', (0, 0), (-1, -1), 5),
-            ]))
-            elements.append(meta_table)
-            elements.append(Spacer(1, 0.3*inch))
-            
-            # === RINGKASAN PERCAKAPAN ===
-            elements.append(Paragraph("📝 Ringkasan Analisis", styles['SectionTitle']))
-            elements.append(Spacer(1, 0.1*inch))
-            
-            for msg in session_data['messages']:
-                sender = "👤 Pengguna" if msg['sender'] == 'user' else "🤖 AI Asisten"
-                elements.append(Paragraph(f"<b>{sender}:</b>", styles['SubSection']))
-                
-                # Clean and format content
-                content = msg['content'].replace('\n', '<br/>')
-                content = content.replace('**', '<b>').replace('**', '</b>')
-                elements.append(Paragraph(content, styles['BodyTextCustom']))
-                elements.append(Spacer(1, 0.15*inch))
-            
-            # === VISUALISASI DATA ===
-            if session_data['visualizations']:
-                elements.append(PageBreak())
-                elements.append(Paragraph("📈 Data Visualisasi", styles['SectionTitle']))
-                elements.append(Spacer(1, 0.1*inch))
-                
-                elements.append(Paragraph(
-                    "<i>Catatan: Grafik interaktif tersedia di aplikasi web. "
-                    "Berikut adalah ringkasan data dari setiap visualisasi:</i>",
+            elements.append(rl.Spacer(1, 0.15*rl.inch))
+        return elements
+    
+    def _build_pdf_viz(self, session_data: dict, styles) -> list:
+        if not session_data['visualizations']:
+            return []
+        
+        rl = _get_pdf_deps()
+        
+        elements = [
+            rl.PageBreak(),
+            rl.Paragraph("Data Visualisasi", styles['SectionTitle']),
+            rl.Spacer(1, 0.1*rl.inch),
+            rl.Paragraph(
+                "<i>Catatan: Grafik interaktif tersedia di aplikasi web. "
+                "Berikut adalah ringkasan data dari setiap visualisasi:</i>",
+                styles['BodyTextCustom']
+            ),
+            rl.Spacer(1, 0.15*rl.inch)
+        ]
+        
+        for i, viz in enumerate(session_data['visualizations'], 1):
+            viz_title = viz.get('title', f'Visualisasi {i}')
+            elements.append(rl.Paragraph(f"{i}. {_safe_para(viz_title)}", styles['SubSection']))
+        
+            # Extract and display data summary
+            labels, values = self._extract_chart_data_summary(viz)
+        
+            if labels:
+                # Create data table
+                table_data = [['No.', 'Kategori', 'Jumlah Usaha']]
+                table_data.extend(
+                    [str(j), label, _format_value(value)]
+                    for j, (label, value) in enumerate(zip(labels, values), 1)
+                )
+        
+                # Add total row if numeric
+                total = _numeric_total(values)
+                if total > 0:
+                    table_data.append(['', 'TOTAL', f"{int(total):,}"])
+        
+                viz_table = rl.Table(table_data, colWidths=[40, 250, 120])
+                viz_table.setStyle(self._viz_table_style)
+                elements.append(viz_table)
+            else:
+                elements.append(rl.Paragraph(
+                    f"<i>Tipe: {_safe_para(viz.get('type', 'chart'))}</i>",
                     styles['BodyTextCustom']
                 ))
-                elements.append(Spacer(1, 0.15*inch))
-                
-                for i, viz in enumerate(session_data['visualizations'], 1):
-                    viz_title = viz.get('title', f'Visualisasi {i}')
-                    elements.append(Paragraph(f"📊 {i}. {viz_title}", styles['SubSection']))
-                    
-                    # Extract and display data summary
-                    data_summary = self._extract_chart_data_summary(viz)
-                    
-                    if data_summary:
-                        # Create data table
-                        table_data = [['No.', 'Kategori', 'Jumlah Usaha']]
-                        total = 0
-                        for j, item in enumerate(data_summary, 1):
-                            value = item['value']
-                            if isinstance(value, (int, float)):
-                                total += value
-                                table_data.append([str(j), item['label'], f"{int(value):,}"])
-                            else:
-                                table_data.append([str(j), item['label'], str(value)])
-                        
-                        # Add total row if numeric
-                        if total > 0:
-                            table_data.append(['', 'TOTAL', f"{int(total):,}"])
-                        
-                        viz_table = Table(table_data, colWidths=[40, 250, 120])
-                        viz_table.setStyle(TableStyle([
-                            ('BACKGROUND', (0, 0), (-1, 0), self.primary_color),
-                            ('TEXTCOLOR', (0, 0), (-1, 0), white),
-                            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                            ('FONTSIZE', (0, 0), (-1, -1), 9),
-                            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                            ('ALIGN', (2, 0), (2, -1), 'RIGHT'),
-                            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-                            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-                            ('ROWBACKGROUNDS', (0, 1), (-1, -2), [white, self.light_bg]),
-                            ('BACKGROUND', (0, -1), (-1, -1), HexColor('#ecf0f1')),
-                            ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
-                            ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-                            ('TOPPADDING', (0, 0), (-1, -1), 6),
-                        ]))
-                        elements.append(viz_table)
-                    else:
-                        elements.append(Paragraph(
-                            f"<i>Tipe: {viz.get('type', 'chart')}</i>",
-                            styles['BodyTextCustom']
-                        ))
-                    
-                    elements.append(Spacer(1, 0.2*inch))
-            
-            # === INSIGHTS ===
-            if session_data['insights']:
-                elements.append(PageBreak())
-                elements.append(Paragraph("💡 Insight Analisis", styles['SectionTitle']))
-                elements.append(Spacer(1, 0.1*inch))
-                
-                for i, insight in enumerate(session_data['insights'], 1):
-                    insight_text = insight if isinstance(insight, str) else str(insight)
-                    elements.append(Paragraph(
-                        f"<b>{i}.</b> {insight_text}",
-                        styles['InsightText']
-                    ))
-                    elements.append(Spacer(1, 0.05*inch))
-            
-            # === POLICY RECOMMENDATIONS ===
-            if session_data['policies']:
-                elements.append(PageBreak())
-                elements.append(Paragraph("🎯 Rekomendasi Kebijakan", styles['SectionTitle']))
-                elements.append(Spacer(1, 0.1*inch))
-                
-                for i, policy in enumerate(session_data['policies'], 1):
-                    # Policy title with priority badge
-                    priority = policy.get('priority', 'medium')
-                    priority_colors = {
-                        'high': '🔴',
-                        'medium': '🟡', 
-                        'low': '🟢'
-                    }
-                    priority_badge = priority_colors.get(priority, '🟡')
-                    
-                    policy_title = f"{priority_badge} {i}. {policy.get('title', 'Rekomendasi')}"
-                    elements.append(Paragraph(policy_title, styles['PolicyTitle']))
-                    
-                    # Description
-                    description = policy.get('description', '')
-                    if description:
-                        elements.append(Paragraph(description, styles['BodyTextCustom']))
-                    
-                    # Category and Impact
-                    category = policy.get('category', '')
-                    impact = policy.get('impact', '')
-                    
-                    if category or impact:
-                        meta_text = []
-                        if category:
-                            meta_text.append(f"<b>Kategori:</b> {category}")
-                        if impact:
-                            meta_text.append(f"<b>Dampak:</b> {impact}")
-                        elements.append(Paragraph(' | '.join(meta_text), styles['BodyTextCustom']))
-                    
-                    # Implementation steps
-                    steps = policy.get('implementation_steps', [])
-                    if steps:
-                        elements.append(Paragraph("<b>Langkah Implementasi:</b>", styles['BodyTextCustom']))
-                        for j, step in enumerate(steps, 1):
-                            elements.append(Paragraph(
-                                f"    {j}. {step}",
-                                styles['InsightText']
-                            ))
-                    
-                    elements.append(Spacer(1, 0.15*inch))
-            
-            # === FOOTER ===
-            elements.append(Spacer(1, 0.3*inch))
-            elements.append(Paragraph(
+        
+            elements.append(rl.Spacer(1, 0.2*rl.inch))
+        return elements
+    
+    def _build_pdf_insights(self, session_data: dict, styles) -> list:
+        if not session_data['insights']:
+            return []
+        
+        rl = _get_pdf_deps()
+        
+        # All insights go into one numbered Paragraph instead of a Paragraph + Spacer each
+        insights_html = '<br/>'.join(
+            f"<b>{i}.</b> {_safe_para(insight)}"
+            for i, insight in enumerate(session_data['insights'], 1)
+        )
+        return [
+            rl.PageBreak(),
+            rl.Paragraph("Insight Analisis", styles['SectionTitle']),
+            rl.Spacer(1, 0.1*rl.inch),
+            rl.Paragraph(insights_html, styles['InsightText']),
+            rl.Spacer(1, 0.05*rl.inch)
+        ]
+    
+    def _build_pdf_policies(self, session_data: dict, styles) -> list:
+        if not session_data['policies']:
+            return []
+        
+        rl = _get_pdf_deps()
+        
+        elements = [
+            rl.PageBreak(),
+            rl.Paragraph("Rekomendasi Kebijakan", styles['SectionTitle']),
+            rl.Spacer(1, 0.1*rl.inch)
+        ]
+        
+        for i, policy in enumerate(session_data['policies'], 1):
+            # Policy title with priority badge
+            priority = policy.get('priority', 'medium')
+            priority_badge = self._PRIORITY_PDF.get(priority, '[Menengah]')
+        
+            policy_title = f"{priority_badge} {i}. {_safe_para(policy.get('title', 'Rekomendasi'))}"
+            elements.append(rl.Paragraph(policy_title, styles['PolicyTitle']))
+        
+            # Description
+            description = policy.get('description', '')
+            if description:
+                elements.append(rl.Paragraph(_safe_para(description), styles['BodyTextCustom']))
+        
+            # Category and Impact
+            category = policy.get('category', '')
+            impact = policy.get('impact', '')
+        
+            if category or impact:
+                meta_text = []
+                if category:
+                    meta_text.append(f"<b>Kategori:</b> {_safe_para(category)}")
+                if impact:
+                    meta_text.append(f"<b>Dampak:</b> {_safe_para(impact)}")
+                elements.append(rl.Paragraph(' | '.join(meta_text), styles['BodyTextCustom']))
+        
+            # Implementation steps
+            steps = policy.get('implementation_steps', [])
+            if steps:
+                elements.append(rl.Paragraph("<b>Langkah Implementasi:</b>", styles['BodyTextCustom']))
+                steps_html = '<br/>'.join(
+                    f"    {j}. {_safe_para(step)}" for j, step in enumerate(steps, 1)
+                )
+                elements.append(rl.Paragraph(steps_html, styles['InsightText']))
+        
+            elements.append(rl.Spacer(1, 0.15*rl.inch))
+        return elements
+    
+    def _build_pdf_footer(self, year: int, styles) -> list:
+        rl = _get_pdf_deps()
+        
+        return [
+            rl.Spacer(1, 0.3*rl.inch),
+            rl.Paragraph(
                 "─" * 60,
                 styles['BodyTextCustom']
-            ))
-            elements.append(Paragraph(
+            ),
+            rl.Paragraph(
                 f"<i>Laporan ini dihasilkan secara otomatis oleh Sistem Analisis Sensus Ekonomi Indonesia.<br/>"
                 f"Data bersumber dari Sensus Ekonomi 2016, Badan Pusat Statistik (BPS).<br/>"
-                f"© {datetime.now().year} - Smart SE26 Agentic AI Chatbot</i>",
-                ParagraphStyle(
-                    'Footer',
-                    parent=styles['BodyText'],
-                    fontSize=8,
-                    alignment=TA_CENTER,
-                    textColor=colors.grey
-                )
-            ))
-            
-            doc.build(elements)
-            buffer.seek(0)
-            return buffer
-            
-        except Exception as e:
-            logger.error(f"Error generating PDF: {e}", exc_info=True)
-            raise
+                f"© {year} - Smart SE26 Agentic AI Chatbot</i>",
+                styles['Footer']
+            )
+        ]
     
-    def generate_docx(self, session) -> BytesIO:
+    def generate_docx(self, session, output: Optional[BinaryIO] = None) -> BinaryIO:
         """Generate comprehensive Word document with visualizations and policies"""
         try:
-            doc = Document()
-            
-            # Set document margins
-            sections = doc.sections
-            for section in sections:
-                section.top_margin = Cm(2)
-                section.bottom_margin = Cm(2)
-                section.left_margin = Cm(2.5)
-                section.right_margin = Cm(2.5)
-            
-            # Extract session data
-            session_data = self._extract_session_data(session)
-            
-            # === TITLE ===
-            title = doc.add_heading('Laporan Analisis Sensus Ekonomi Indonesia', 0)
-            title.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
-            for run in title.runs:
-                run.font.color.rgb = RGBColor(231, 76, 60)
-            
-            # === METADATA ===
-            doc.add_paragraph()
-            date_str = datetime.now().strftime("%d %B %Y, %H:%M WIB")
-            
-            meta_table = doc.add_table(rows=4, cols=2)
-            meta_table.style = 'Table Grid'
-            
-            meta_data = [
-                ('Tanggal Pembuatan', date_str),
-                ('Topik Analisis', session_data['title']),
-                ('Jumlah Visualisasi', str(len(session_data['visualizations']))),
-                ('Jumlah Rekomendasi', str(len(session_data['policies'])))
-            ]
+            return self._build_docx_from_data(self._extract_session_data(session), output)
+        except Exception as e:
+            logger.error(f"Error generating DOCX: {e}", exc_info=True)
+            raise
+    
+    def _build_docx_from_data(self, session_data: dict, output: Optional[BinaryIO] = None) -> BinaryIO:
+        """Render already-extracted session data as a Word document"""
+        dx = _get_docx_deps()
+        now = datetime.now()
+        date_str = now.strftime("%d %B %Y, %H:%M WIB")
+        year = now.year
+        
+        buffer = output if output is not None else BytesIO()
+        doc = dx.Document()
+        
+        # Set document margins
+        sections = doc.sections
+        for section in sections:
+            section.top_margin = dx.Cm(2)
+            section.bottom_margin = dx.Cm(2)
+            section.left_margin = dx.Cm(2.5)
+            section.right_margin = dx.Cm(2.5)
+        
+        # === TITLE ===
+        title = doc.add_heading('Laporan Analisis Sensus Ekonomi Indonesia', 0)
+        title.alignment = dx.WD_PARAGRAPH_ALIGNMENT.CENTER
+        for run in title.runs:
+            run.font.color.rgb = dx.RGBColor(231, 76, 60)
+        
+        # === METADATA ===
+        doc.add_paragraph()
+        self._append_xml_table(
+            doc, None, self._build_meta_rows(session_data, date_str), bold_first_col=True
+        )
+        
+        doc.add_paragraph()
+        
+        # === RINGKASAN ANALISIS ===
+        doc.add_heading('📝 Ringkasan Analisis', level=1)
+        
+        for msg in session_data['messages']:
+            sender = _SENDER_LABELS.get(msg['sender'], _AI_SENDER)[1]
             
-            for i, (label, value) in enumerate(meta_data):
-                row = meta_table.rows[i]
-                row.cells[0].text = label
-                row.cells[1].text = value
-                row.cells[0].paragraphs[0].runs[0].bold = True
+            p = doc.add_paragraph()
+            runner = p.add_run(f"{sender}:")
+            runner.bold = True
+            runner.font.size = dx.Pt(11)
             
+            content_p = doc.add_paragraph(msg['content'])
+            content_p.paragraph_format.left_indent = dx.Inches(0.25)
             doc.add_paragraph()
+        
+        # === VISUALISASI DATA ===
+        if session_data['visualizations']:
+            doc.add_page_break()
+            doc.add_heading('📈 Data Visualisasi', level=1)
             
-            # === RINGKASAN ANALISIS ===
-            doc.add_heading('📝 Ringkasan Analisis', level=1)
+            note = doc.add_paragraph()
+            note_run = note.add_run(
+                'Catatan: Grafik interaktif tersedia di aplikasi web. '
+                'Berikut adalah ringkasan data dari setiap visualisasi:'
+            )
+            note_run.italic = True
+            note_run.font.size = dx.Pt(10)
             
-            for msg in session_data['messages']:
-                sender = "👤 Pengguna" if msg['sender'] == 'user' else "🤖 AI Asisten"
+            for i, viz in enumerate(session_data['visualizations'], 1):
+                viz_title = viz.get('title', f'Visualisasi {i}')
+                doc.add_heading(f'📊 {i}. {viz_title}', level=2)
+                
+                # Extract and display data summary
+                labels, values = self._extract_chart_data_summary(viz)
                 
-                p = doc.add_paragraph()
-                runner = p.add_run(f"{sender}:")
-                runner.bold = True
-                runner.font.size = Pt(11)
+                if labels:
+                    # Create data table with a bold TOTAL row
+                    rows = [
+                        (str(j), label, _format_value(value))
+                        for j, (label, value) in enumerate(zip(labels, values), 1)
+                    ]
+                    rows.append(('', 'TOTAL', f"{int(_numeric_total(values)):,}"))
+                    self._append_xml_table(
+                        doc, ('No.', 'Kategori', 'Jumlah Usaha'), rows,
+                        highlight_last=True, center=True
+                    )
+                else:
+                    p = doc.add_paragraph()
+                    p.add_run(f"Tipe: {viz.get('type', 'chart')}").italic = True
                 
-                content_p = doc.add_paragraph(msg['content'])
-                content_p.paragraph_format.left_indent = Inches(0.25)
                 doc.add_paragraph()
+        
+        # === INSIGHTS ===
+        if session_data['insights']:
+            doc.add_page_break()
+            doc.add_heading('💡 Insight Analisis', level=1)
+            
+            self._append_xml_list(doc, session_data['insights'])
+        
+        # === POLICY RECOMMENDATIONS ===
+        if session_data['policies']:
+            doc.add_page_break()
+            doc.add_heading('🎯 Rekomendasi Kebijakan', level=1)
             
-            # === VISUALISASI DATA ===
-            if session_data['visualizations']:
-                doc.add_page_break()
-                doc.add_heading('📈 Data Visualisasi', level=1)
+            for i, policy in enumerate(session_data['policies'], 1):
+                # Policy title with priority
+                priority = policy.get('priority', 'medium')
                 
-                note = doc.add_paragraph()
-                note_run = note.add_run(
-                    'Catatan: Grafik interaktif tersedia di aplikasi web. '
-                    'Berikut adalah ringkasan data dari setiap visualisasi:'
-                )
-                note_run.italic = True
-                note_run.font.size = Pt(10)
+                title_text = f"{i}. {policy.get('title', 'Rekomendasi')}"
+                doc.add_heading(title_text, level=2)
                 
-                for i, viz in enumerate(session_data['visualizations'], 1):
-                    viz_title = viz.get('title', f'Visualisasi {i}')
-                    doc.add_heading(f'📊 {i}. {viz_title}', level=2)
-                    
-                    # Extract and display data summary
-                    data_summary = self._extract_chart_data_summary(viz)
-                    
-                    if data_summary:
-                        # Create data table
-                        table = doc.add_table(rows=len(data_summary) + 2, cols=3)
-                        table.style = 'Table Grid'
-                        table.alignment = WD_TABLE_ALIGNMENT.CENTER
-                        
-                        # Header row
-                        header_cells = table.rows[0].cells
-                        header_cells[0].text = 'No.'
-                        header_cells[1].text = 'Kategori'
-                        header_cells[2].text = 'Jumlah Usaha'
-                        
-                        for cell in header_cells:
-                            cell.paragraphs[0].runs[0].bold = True
-                            shading = OxmlElement('w:shd')
-                            shading.set(qn('w:fill'), 'E74C3C')
-                            cell._tc.get_or_add_tcPr().append(shading)
-                            cell.paragraphs[0].runs[0].font.color.rgb = RGBColor(255, 255, 255)
-                        
-                        # Data rows
-                        total = 0
-                        for j, item in enumerate(data_summary, 1):
-                            row = table.rows[j]
-                            row.cells[0].text = str(j)
-                            row.cells[1].text = item['label']
-                            value = item['value']
-                            if isinstance(value, (int, float)):
-                                total += value
-                                row.cells[2].text = f"{int(value):,}"
-                            else:
-                                row.cells[2].text = str(value)
-                        
-                        # Total row
-                        total_row = table.rows[-1]
-                        total_row.cells[0].text = ''
-                        total_row.cells[1].text = 'TOTAL'
-                        total_row.cells[1].paragraphs[0].runs[0].bold = True
-                        total_row.cells[2].text = f"{int(total):,}"
-                        total_row.cells[2].paragraphs[0].runs[0].bold = True
-                    else:
-                        p = doc.add_paragraph()
-                        p.add_run(f"Tipe: {viz.get('type', 'chart')}").italic = True
-                    
-                    doc.add_paragraph()
-            
-            # === INSIGHTS ===
-            if session_data['insights']:
-                doc.add_page_break()
-                doc.add_heading('💡 Insight Analisis', level=1)
+                # Priority badge
+                priority_p = doc.add_paragraph()
+                priority_run = priority_p.add_run(self._PRIORITY_DOCX.get(priority, '🟡 Prioritas Menengah'))
+                priority_run.font.size = dx.Pt(10)
+                priority_run.italic = True
                 
-                for i, insight in enumerate(session_data['insights'], 1):
-                    insight_text = insight if isinstance(insight, str) else str(insight)
-                    p = doc.add_paragraph(style='List Number')
-                    p.add_run(insight_text)
-            
-            # === POLICY RECOMMENDATIONS ===
-            if session_data['policies']:
-                doc.add_page_break()
-                doc.add_heading('🎯 Rekomendasi Kebijakan', level=1)
+                # Description
+                description = policy.get('description', '')
+                if description:
+                    doc.add_paragraph(description)
                 
-                for i, policy in enumerate(session_data['policies'], 1):
-                    # Policy title with priority
-                    priority = policy.get('priority', 'medium')
-                    priority_icons = {
-                        'high': '🔴 Prioritas Tinggi',
-                        'medium': '🟡 Prioritas Menengah',
-                        'low': '🟢 Prioritas Rendah'
-                    }
-                    
-                    title_text = f"{i}. {policy.get('title', 'Rekomendasi')}"
-                    h = doc.add_heading(title_text, level=2)
-                    
-                    # Priority badge
-                    priority_p = doc.add_paragraph()
-                    priority_run = priority_p.add_run(priority_icons.get(priority, '🟡 Prioritas Menengah'))
-                    priority_run.font.size = Pt(10)
-                    priority_run.italic = True
-                    
-                    # Description
-                    description = policy.get('description', '')
-                    if description:
-                        doc.add_paragraph(description)
-                    
-                    # Category and Impact
-                    category = policy.get('category', '')
-                    impact = policy.get('impact', '')
-                    
-                    if category:
-                        p = doc.add_paragraph()
-                        p.add_run('Kategori: ').bold = True
-                        p.add_run(str(category))
-                    
-                    if impact:
-                        p = doc.add_paragraph()
-                        p.add_run('Dampak: ').bold = True
-                        p.add_run(impact)
-                    
-                    # Implementation steps
-                    steps = policy.get('implementation_steps', [])
-                    if steps:
-                        p = doc.add_paragraph()
-                        p.add_run('Langkah Implementasi:').bold = True
-                        
-                        for j, step in enumerate(steps, 1):
-                            step_p = doc.add_paragraph(style='List Number')
-                            step_p.add_run(step)
-                            step_p.paragraph_format.left_indent = Inches(0.5)
+                # Category and Impact
+                category = policy.get('category', '')
+                impact = policy.get('impact', '')
+                
+                if category:
+                    p = doc.add_paragraph()
+                    p.add_run('Kategori: ').bold = True
+                    p.add_run(str(category))
+                
+                if impact:
+                    p = doc.add_paragraph()
+                    p.add_run('Dampak: ').bold = True
+                    p.add_run(impact)
+                
+                # Implementation steps
+                steps = policy.get('implementation_steps', [])
+                if steps:
+                    p = doc.add_paragraph()
+                    p.add_run('Langkah Implementasi:').bold = True
                     
-                    doc.add_paragraph()
-            
-            # === FOOTER ===
-            doc.add_paragraph()
-            doc.add_paragraph('─' * 50)
-            
-            footer = doc.add_paragraph()
-            footer.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
-            footer_run = footer.add_run(
-                f'Laporan ini dihasilkan secara otomatis oleh Sistem Analisis Sensus Ekonomi Indonesia.\n'
-                f'Data bersumber dari Sensus Ekonomi 2016, Badan Pusat Statistik (BPS).\n'
-                f'© {datetime.now().year} - Smart SE26 Agentic AI Chatbot'
+                    self._append_xml_list(doc, steps, left_indent=720)  # 0.5"
+                
+                doc.add_paragraph()
+        
+        # === FOOTER ===
+        doc.add_paragraph()
+        doc.add_paragraph('─' * 50)
+        
+        footer = doc.add_paragraph()
+        footer.alignment = dx.WD_PARAGRAPH_ALIGNMENT.CENTER
+        footer_run = footer.add_run(
+            f'Laporan ini dihasilkan secara otomatis oleh Sistem Analisis Sensus Ekonomi Indonesia.\n'
+            f'Data bersumber dari Sensus Ekonomi 2016, Badan Pusat Statistik (BPS).\n'
+            f'© {year} - Smart SE26 Agentic AI Chatbot'
+        )
+        footer_run.font.size = dx.Pt(8)
+        footer_run.font.color.rgb = dx.RGBColor(128, 128, 128)
+        footer_run.italic = True
+        
+        # Save to buffer
+        doc.save(buffer)
+        buffer.seek(0)
+        return buffer
+    
+    def _append_xml_table(self, doc, header: Optional[tuple], rows: List[tuple],
+                          highlight_last: bool = False, bold_first_col: bool = False,
+                          center: bool = False):
+        """Append a 'Table Grid' table built as one XML string instead of cell by cell"""
+        dx = _get_docx_deps()
+        section = doc.sections[-1]
+        n_cols = len(header or rows[0])
+        # EMU -> twips, split evenly like python-docx's add_table
+        col_width = (section.page_width - section.left_margin - section.right_margin) // 635 // n_cols
+        
+        def cell(text, bold=False, header_cell=False):
+            run_props = ''
+            if bold or header_cell:
+                run_props = '<w:rPr><w:b/>' + ('<w:color w:val="FFFFFF"/>' if header_cell else '') + '</w:rPr>'
+            shading = '<w:shd w:val="clear" w:color="auto" w:fill="E74C3C"/>' if header_cell else ''
+            return _DOCX_CELL.format(
+                width=col_width, shading=shading, run_props=run_props, text=_xml_escape(str(text))
             )
-            footer_run.font.size = Pt(8)
-            footer_run.font.color.rgb = RGBColor(128, 128, 128)
-            footer_run.italic = True
-            
-            # Save to buffer
-            buffer = BytesIO()
-            doc.save(buffer)
-            buffer.seek(0)
-            return buffer
-            
-        except Exception as e:
-            logger.error(f"Error generating DOCX: {e}", exc_info=True)
-            raise
+        
+        xml_rows = []
+        if header:
+            xml_rows.append('<w:tr>' + ''.join(cell(text, header_cell=True) for text in header) + '</w:tr>')
+        last = len(rows) - 1
+        for i, row in enumerate(rows):
+            bold_row = highlight_last and i == last
+            xml_rows.append('<w:tr>' + ''.join(
+                cell(text, bold=bold_row or (bold_first_col and j == 0))
+                for j, text in enumerate(row)
+            ) + '</w:tr>')
+        
+        tbl = dx.parse_xml(_DOCX_TABLE.format(
+            ns=_W_NS,
+            jc='<w:jc w:val="center"/>' if center else '',
+            grid=f'<w:gridCol w:w="{col_width}"/>' * n_cols,
+            rows=''.join(xml_rows)
+        ))
+        # Keeps the table ahead of the trailing sectPr, as add_table does
+        doc.element.body._insert_tbl(tbl)
+    
+    def _append_xml_list(self, doc, items: list, left_indent: Optional[int] = None):
+        """Append a 'List Number' list as one parsed XML block, numbered from 1"""
+        dx = _get_docx_deps()
+        # A fresh w:num over the style's abstract numbering restarts the count for this list
+        numbering = doc.part.numbering_part.element
+        style_num_id = doc.styles['List Number'].element.pPr.numPr.numId.val
+        num = numbering.add_num(numbering.num_having_numId(style_num_id).abstractNumId.val)
+        num.add_lvlOverride(ilvl=0).add_startOverride(1)
+        
+        indent = f'<w:ind w:left="{left_indent}"/>' if left_indent is not None else ''
+        block = dx.parse_xml(_DOCX_LIST.format(ns=_W_NS, items=''.join(
+            _DOCX_LIST_ITEM.format(num_id=num.numId, indent=indent, text=_xml_escape(str(item)))
+            for item in items
+        )))
+        sect_pr = doc.element.body.sectPr
+        for paragraph in list(block):
+            if sect_pr is not None:
+                sect_pr.addprevious(paragraph)
+            else:
+                doc.element.body.append(paragraph)
+    
+    @staticmethod
+    def _render_html_message(msg: dict) -> str:
+        sender_class, sender_label = _SENDER_LABELS.get(msg['sender'], _AI_SENDER)
+        content = str(msg['content']).translate(_HTML_ESCAPE_BR)
+        
+        return f"""
+                <div class='message {sender_class}'>
+                    <div class='sender'>{sender_label}</div>
+                    <div class='content'>{content}</div>
+                </div>
+                """
     
     def generate_html_report(self, session) -> str:
         """Generate HTML report with embedded chart configurations for web viewing"""
+        return ''.join(self.iter_html_report(session))
+    
+    def iter_html_report(self, session) -> Iterator[str]:
+        """HTML report as a stream of chunks for StreamingResponse; extraction errors raise before streaming"""
+        return _coalesce(self._start_html_parts(session, _HTML_REPORT_STATIC))
+    
+    def iter_html_report_bytes(self, session) -> Iterator[bytes]:
+        """Same stream as UTF-8 bytes; the static skeleton is never re-encoded"""
+        return _coalesce_bytes(self._start_html_parts(session, _HTML_REPORT_STATIC_BYTES))
+    
+    async def iter_html_report_bytes_async(self, session) -> Iterator[bytes]:
+        """iter_html_report_bytes with session extraction done on the report pool instead of the event loop"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_REPORT_POOL, self.iter_html_report_bytes, session)
+    
+    def _start_html_parts(self, session, static: Sequence[_Static]) -> Iterator[Union[str, _Static]]:
         try:
             session_data = self._extract_session_data(session)
-            date_str = datetime.now().strftime("%d %B %Y, %H:%M WIB")
-            
-            # Build visualizations HTML with ECharts
-            viz_html = ""
-            chart_scripts = ""
-            
-            if session_data['visualizations']:
-                viz_html = "<section class='section'><h2>📈 Data Visualisasi</h2>"
-                
-                for i, viz in enumerate(session_data['visualizations']):
-                    chart_id = f"chart_{i}"
-                    viz_title = viz.get('title', f'Visualisasi {i+1}')
-                    config = viz.get('config', {})
-                    
-                    viz_html += f"""
+        except Exception as e:
+            logger.error(f"Error generating HTML report: {e}", exc_info=True)
+            raise
+        now = datetime.now()
+        return self._iter_html_parts(session_data, now.strftime("%d %B %Y, %H:%M WIB"), now.year, static)
+    
+    def _iter_html_parts(
+        self, session_data: dict, date_str: str, year: int,
+        static: Sequence[_Static]
+    ) -> Iterator[Union[str, _Static]]:
+        visualizations = session_data['visualizations']
+        insights = session_data['insights']
+        slots: Dict[str, Iterable[str]] = {
+            'date_str': (date_str,),
+            'title': (_esc(session_data['title']),),
+            'messages_html': (self._render_html_message(msg) for msg in session_data['messages']),
+            # Empty sections short-circuit to () so no section markup or generator is built
+            'viz_html': self._iter_html_viz(visualizations) if visualizations else (),
+            'insights_html': self._iter_html_insights(insights) if insights else (),
+            # Jinja's generate() streams the compiled, autoescaped policy template
+            'policies_html': _POLICY_TMPL.generate(
+                policies=[_policy_fields(policy) for policy in session_data['policies']],
+                badges=_HTML_PRIORITY_BADGES
+            ) if session_data['policies'] else (),
+            'year': (str(year),),
+            'chart_loader': (_HTML_CHART_LOADER,) if visualizations else (),
+            'chart_scripts': self._iter_html_chart_scripts(visualizations) if visualizations else (),
+        }
+        try:
+            for markup, slot in itertools.zip_longest(static, _HTML_REPORT_SLOTS):
+                if markup:
+                    yield markup
+                if slot is not None:
+                    yield from slots[slot]
+        except Exception as e:
+            logger.error(f"Error generating HTML report: {e}", exc_info=True)
+            raise
+    
+    @staticmethod
+    def _iter_html_viz(visualizations: list) -> Iterator[str]:
+        yield "<section class='section'><h2>📈 Data Visualisasi</h2>"
+        for i, viz in enumerate(visualizations):
+            yield f"""
                     <div class='chart-container'>
-                        <h3>{viz_title}</h3>
-                        <div id='{chart_id}' class='chart'></div>
+                        <h3>{_esc(viz.get('title', f'Visualisasi {i+1}'))}</h3>
+                        <div id='chart_{i}' class='chart'></div>
                     </div>
                     """
-                    
-                    config_json = json.dumps(config, ensure_ascii=False)
-                    chart_scripts += f"""
+        yield "</section>"
+    
+    def _iter_html_chart_scripts(self, visualizations: list) -> Iterator[str]:
+        yield "<script>"
+        for i, viz in enumerate(visualizations):
+            chart_id = f"chart_{i}"
+            config_json = self._encoder.encode(viz.get('config', {}))
+            yield f"""
                     var {chart_id} = echarts.init(document.getElementById('{chart_id}'));
                     {chart_id}.setOption({config_json});
                     """
-                
-                viz_html += "</section>"
-            
-            # Build insights HTML
-            insights_html = ""
-            if session_data['insights']:
-                insights_html = "<section class='section'><h2>💡 Insight Analisis</h2><ul class='insights-list'>"
-                for insight in session_data['insights']:
-                    insight_text = insight if isinstance(insight, str) else str(insight)
-                    insights_html += f"<li>{insight_text}</li>"
-                insights_html += "</ul></section>"
-            
-            # Build policies HTML
-            policies_html = ""
-            if session_data['policies']:
-                policies_html = "<section class='section'><h2>🎯 Rekomendasi Kebijakan</h2>"
-                
-                for i, policy in enumerate(session_data['policies'], 1):
-                    priority = policy.get('priority', 'medium')
-                    priority_class = f"priority-{priority}"
-                    priority_badges = {
-                        'high': '🔴 Prioritas Tinggi',
-                        'medium': '🟡 Prioritas Menengah',
-                        'low': '🟢 Prioritas Rendah'
-                    }
-                    
-                    steps_html = ""
-                    steps = policy.get('implementation_steps', [])
-                    if steps:
-                        steps_html = "<div class='steps'><strong>Langkah Implementasi:</strong><ol>"
-                        for step in steps:
-                            steps_html += f"<li>{step}</li>"
-                        steps_html += "</ol></div>"
-                    
-                    policies_html += f"""
-                    <div class='policy-card {priority_class}'>
-                        <div class='policy-header'>
-                            <h3>{i}. {policy.get('title', 'Rekomendasi')}</h3>
-                            <span class='priority-badge'>{priority_badges.get(priority, '🟡')}</span>
-                        </div>
-                        <p class='description'>{policy.get('description', '')}</p>
-                        <p class='meta'><strong>Kategori:</strong> {policy.get('category', '-')} | <strong>Dampak:</strong> {policy.get('impact', '-')}</p>
-                        {steps_html}
-                    </div>
-                    """
-                
-                policies_html += "</section>"
-            
-            # Build messages HTML
-            messages_html = ""
-            for msg in session_data['messages']:
-                sender_class = 'user' if msg['sender'] == 'user' else 'ai'
-                sender_label = '👤 Pengguna' if msg['sender'] == 'user' else '🤖 AI Asisten'
-                content = msg['content'].replace('\n', '<br>')
-                
-                messages_html += f"""
-                <div class='message {sender_class}'>
-                    <div class='sender'>{sender_label}</div>
-                    <div class='content'>{content}</div>
-                </div>
-                """
-            
-            # Complete HTML
-            html = f"""<!DOCTYPE html>
-<html lang="id">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>Laporan Analisis Sensus Ekonomi</title>
-    <script src="https://cdn.jsdelivr.net/npm/echarts@5.4.3/dist/echarts.min.js"></script>
-    <style>
-        * {{ margin: 0; padding: 0; box-sizing: border-box; }}
-        body {{ font-family: 'Segoe UI', Tahoma, sans-serif; line-height: 1.6; color: #2c3e50; background: #f8f9fa; }}
-        .container {{ max-width: 1000px; margin: 0 auto; padding: 20px; }}
-        .header {{ background: linear-gradient(135deg, #e74c3c, #c0392b); color: white; padding: 30px; text-align: center; border-radius: 10px; margin-bottom: 20px; }}
-        .header h1 {{ font-size: 1.8rem; margin-bottom: 10px; }}
-        .meta {{ font-size: 0.9rem; opacity: 0.9; }}
-        .section {{ background: white; padding: 25px; border-radius: 10px; margin-bottom: 20px; box-shadow: 0 2px 10px rgba(0,0,0,0.05); }}
-        .section h2 {{ color: #e74c3c; margin-bottom: 15px; font-size: 1.3rem; }}
-        .message {{ padding: 15px; margin-bottom: 15px; border-radius: 8px; }}
-        .message.user {{ background: #e8f4f8; border-left: 4px solid #3498db; }}
-        .message.ai {{ background: #fef5e7; border-left: 4px solid #f39c12; }}
-        .sender {{ font-weight: bold; margin-bottom: 8px; }}
-        .chart-container {{ margin-bottom: 25px; padding: 15px; border: 1px solid #eee; border-radius: 8px; }}
-        .chart-container h3 {{ color: #2c3e50; margin-bottom: 10px; font-size: 1rem; }}
-        .chart {{ width: 100%; height: 350px; }}
-        .insights-list {{ list-style: none; }}
-        .insights-list li {{ padding: 10px 15px; margin-bottom: 8px; background: #e8f6f3; border-left: 4px solid #1abc9c; border-radius: 4px; }}
-        .policy-card {{ padding: 20px; margin-bottom: 15px; border-radius: 8px; background: #fafafa; }}
-        .policy-card.priority-high {{ border-left: 4px solid #e74c3c; }}
-        .policy-card.priority-medium {{ border-left: 4px solid #f39c12; }}
-        .policy-card.priority-low {{ border-left: 4px solid #2ecc71; }}
-        .policy-header {{ display: flex; justify-content: space-between; align-items: center; margin-bottom: 10px; }}
-        .policy-header h3 {{ font-size: 1.1rem; color: #2c3e50; }}
-        .priority-badge {{ font-size: 0.85rem; }}
-        .description {{ margin-bottom: 10px; }}
-        .meta {{ font-size: 0.9rem; color: #666; margin-bottom: 10px; }}
-        .steps {{ background: white; padding: 10px 15px; border-radius: 5px; margin-top: 10px; }}
-        .steps ol {{ margin-left: 20px; margin-top: 8px; }}
-        .footer {{ text-align: center; padding: 20px; color: #666; font-size: 0.85rem; }}
-        @media print {{ .chart {{ page-break-inside: avoid; }} }}
-    </style>
-</head>
-<body>
-    <div class="container">
-        <div class="header">
-            <h1>📊 Laporan Analisis Sensus Ekonomi Indonesia</h1>
-            <p class="meta">Tanggal: {date_str} | Topik: {session_data['title']}</p>
-        </div>
-        
-        <section class="section">
-            <h2>📝 Ringkasan Analisis</h2>
-            {messages_html}
-        </section>
-        
-        {viz_html}
-        {insights_html}
-        {policies_html}
-        
-        <div class="footer">
-            <p>Laporan ini dihasilkan secara otomatis oleh Sistem Analisis Sensus Ekonomi Indonesia.<br>
-            Data bersumber dari Sensus Ekonomi 2016, BPS. © {datetime.now().year}</p>
-        </div>
-    </div>
+        yield _HTML_CHART_RESIZE
     
-    <script>
-        {chart_scripts}
-        window.addEventListener('resize', function() {{
-            var charts = document.querySelectorAll('.chart');
-            charts.forEach(function(el) {{
-                var chart = echarts.getInstanceByDom(el);
-                if (chart) chart.resize();
-            }});
-        }});
-    </script>
-</body>
-</html>"""
-            
-            return html
-            
-        except Exception as e:
-            logger.error(f"Error generating HTML report: {e}", exc_info=True)
-            raise
\ No newline at end of file
+    @staticmethod
+    def _iter_html_insights(insights: list) -> Iterator[str]:
+        yield "<section class='section'><h2>💡 Insight Analisis</h2><ul class='insights-list'>"
+        for insight in insights:
+            yield f"<li>{_esc(insight)}</li>"
+        yield "</ul></section>"
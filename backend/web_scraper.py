@@ -11,11 +11,16 @@ logger = logging.getLogger(__name__)
 
 
 class PolicyDataScraper:
-    def __init__(self):
-        self.session = None
+    def __init__(self, session: Optional[aiohttp.ClientSession] = None):
+        # Injected sessions belong to the caller (shared pool) and are not closed here
+        self.session = session
+        self._owns_session = session is None
         
     async def __aenter__(self):
+        if self.session is not None:
+            return self
         self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(ttl_dns_cache=300),
             timeout=aiohttp.ClientTimeout(total=30),
             headers={
                 'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
@@ -24,8 +29,9 @@ class PolicyDataScraper:
         return self
         
     async def __aexit__(self, exc_type, exc_val, exc_tb):
-        if self.session:
+        if self.session and self._owns_session:
             await self.session.close()
+            self.session = None
 
     async def scrape_government_data(self) -> List[ScrapedData]:
         """Scrape government policy websites"""
@@ -418,6 +418,166 @@ class PolicyBackendTester:
             self.log_test_result("Stats Endpoint", False, f"Exception: {str(e)}")
             return False
     
+    async def test_etag_not_modified_endpoints(self) -> bool:
+        """Test If-None-Match revalidation on GET /api/data/recent and /api/stats"""
+        all_ok = True
+        for path in ["/data/recent?limit=10", "/stats"]:
+            test_name = f"ETag Revalidation - {path.split('?')[0]}"
+            try:
+                async with self.session.get(f"{self.base_url}{path}") as response:
+                    etag = response.headers.get('ETag')
+                    if response.status != 200 or not etag:
+                        self.log_test_result(test_name, False, f"HTTP {response.status}, ETag: {etag}")
+                        all_ok = False
+                        continue
+                
+                async with self.session.get(f"{self.base_url}{path}", headers={'If-None-Match': etag}) as response:
+                    body = await response.read()
+                    if response.status != 304:
+                        self.log_test_result(test_name, False, f"Expected HTTP 304 for ETag {etag}, got {response.status}")
+                        all_ok = False
+                    elif body:
+                        self.log_test_result(test_name, False, f"304 response has a {len(body)}-byte body")
+                        all_ok = False
+                    else:
+                        self.log_test_result(test_name, True, f"Matching ETag {etag} answered with an empty 304")
+                        
+            except Exception as e:
+                self.log_test_result(test_name, False, f"Exception: {str(e)}")
+                all_ok = False
+        return all_ok
+    
+    async def test_search_data_array_shape(self) -> bool:
+        """Test that GET /api/data/search streams a well-formed JSON array"""
+        try:
+            async with self.session.get(f"{self.base_url}/data/search?query=policy&limit=5") as response:
+                if response.status != 200:
+                    error_text = await response.text()
+                    self.log_test_result("Search Data Array Shape", False, f"HTTP {response.status}: {error_text}")
+                    return False
+                
+                raw = await response.text()
+                # Parse the raw body: a truncated stream would not be valid JSON
+                data = json.loads(raw)
+                if not isinstance(data, list):
+                    self.log_test_result("Search Data Array Shape", False, "Response is not a JSON array", data)
+                    return False
+                
+                if len(data) > 5:
+                    self.log_test_result("Search Data Array Shape", False, f"limit=5 returned {len(data)} items", data)
+                    return False
+                
+                # Null fields are omitted, so only fields that are always set are required
+                bad_items = [item for item in data if not isinstance(item, dict) or 'url' not in item or 'title' not in item]
+                if bad_items:
+                    self.log_test_result("Search Data Array Shape", False, f"{len(bad_items)} malformed items", data)
+                    return False
+                
+                self.log_test_result("Search Data Array Shape", True, f"Valid JSON array with {len(data)} items", data)
+                return True
+                
+        except Exception as e:
+            self.log_test_result("Search Data Array Shape", False, f"Exception: {str(e)}")
+            return False
+    
+    async def test_batch_endpoint(self) -> bool:
+        """Test POST /api/batch: per-request statuses, param validation and the sub-request cap"""
+        try:
+            batch_request = {
+                "requests": {
+                    "stats": {"op": "stats"},
+                    "recent": {"op": "recent", "params": {"limit": 3}},
+                    "bad_params": {"op": "recent", "params": {"not_a_param": 1}}
+                }
+            }
+            async with self.session.post(f"{self.base_url}/batch", json=batch_request) as response:
+                if response.status != 200:
+                    error_text = await response.text()
+                    self.log_test_result("Batch Endpoint", False, f"HTTP {response.status}: {error_text}")
+                    return False
+                
+                data = await response.json()
+                responses = data.get('responses', {})
+                if set(responses) != set(batch_request["requests"]):
+                    self.log_test_result("Batch Endpoint", False, f"Unexpected response keys: {list(responses)}", data)
+                    return False
+                
+                if responses["stats"].get("status") != 200 or responses["recent"].get("status") != 200:
+                    self.log_test_result("Batch Endpoint", False, "Valid sub-requests did not return status 200", data)
+                    return False
+                
+                if not isinstance(responses["recent"].get("body"), list) or len(responses["recent"]["body"]) > 3:
+                    self.log_test_result("Batch Endpoint", False, "Recent sub-request body is not a list of at most 3 items", data)
+                    return False
+                
+                # Unknown params are the caller's error, not a 500
+                if responses["bad_params"].get("status") != 400:
+                    self.log_test_result("Batch Endpoint", False,
+                                       f"Invalid params returned status {responses['bad_params'].get('status')}, expected 400", data)
+                    return False
+            
+            # More than 10 sub-requests are rejected as a whole
+            oversized_request = {"requests": {f"stats_{i}": {"op": "stats"} for i in range(11)}}
+            async with self.session.post(f"{self.base_url}/batch", json=oversized_request) as response:
+                if response.status != 400:
+                    self.log_test_result("Batch Endpoint", False,
+                                       f"11 sub-requests returned HTTP {response.status}, expected 400")
+                    return False
+            
+            self.log_test_result("Batch Endpoint", True,
+                               "Sub-requests answered, invalid params got 400, oversized batch rejected")
+            return True
+            
+        except Exception as e:
+            self.log_test_result("Batch Endpoint", False, f"Exception: {str(e)}")
+            return False
+    
+    async def test_scrape_lock(self) -> bool:
+        """Test the Mongo-backed lock: a held lock blocks a second acquire and only its owner releases it"""
+        mongo_url = os.environ.get('MONGO_URL')
+        if not mongo_url:
+            self.log_test_result("Scrape Lock", True, "Skipped: MONGO_URL not set")
+            return True
+        
+        try:
+            sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+            from database import PolicyDatabase
+            
+            db = PolicyDatabase(mongo_url, os.environ.get('DB_NAME', 'policy_db'))
+            lock_name = f"backend_test_lock_{datetime.utcnow().timestamp()}"
+            token = None
+            try:
+                token = await db.acquire_lock(lock_name, ttl_seconds=60)
+                if not token:
+                    self.log_test_result("Scrape Lock", False, "First acquire did not return an owner token")
+                    return False
+                
+                if await db.acquire_lock(lock_name, ttl_seconds=60) is not None:
+                    self.log_test_result("Scrape Lock", False, "Second acquire succeeded while the lock was held")
+                    return False
+                
+                # Another owner's token must not release the lock
+                await db.release_lock(lock_name, "not-the-owner")
+                if not await db.is_locked(lock_name):
+                    self.log_test_result("Scrape Lock", False, "Lock released with a foreign owner token")
+                    return False
+                
+                await db.release_lock(lock_name, token)
+                if await db.is_locked(lock_name):
+                    self.log_test_result("Scrape Lock", False, "Owner token did not release the lock")
+                    return False
+                
+                self.log_test_result("Scrape Lock", True, "Held lock blocked a second acquire; only the owner released it")
+                return True
+            finally:
+                if token:
+                    await db.release_lock(lock_name, token)
+                await db.close()
+                
+        except Exception as e:
+            self.log_test_result("Scrape Lock", False, f"Exception: {str(e)}")
+            return False
+    
     async def test_error_handling(self) -> bool:
         """Test error handling with invalid requests"""
         try:
@@ -760,6 +920,12 @@ async def main():
         # Statistics tests
         await tester.test_stats_endpoint()
         
+        # Caching, batching and locking tests
+        await tester.test_etag_not_modified_endpoints()
+        await tester.test_search_data_array_shape()
+        await tester.test_batch_endpoint()
+        await tester.test_scrape_lock()
+        
         # Error handling tests
         await tester.test_error_handling()
         